@@ -1,26 +1,118 @@
 #analyzing results
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmy_sim"))
 
-from os import listdir
+from os import listdir, cpu_count
+from multiprocessing import Pool
+import argparse
+import pandas as pd
+from results_store import read_scalars
 
-def load_results(folder, output):
+#one row per station x albedo x tracker
+TIDY_COLUMNS = ['station', 'tmy_loc_name', 'albedo', 'steps', 'tracker', 'energy']
+BASELINE_TRACKER = "Optimal"
+
+def read_summary(filepath):
+    '''
+    One summary_*.txt file as a dict: header fields plus tracker name -> energy
+    '''
+    with open(filepath, 'r') as f:
+        lines = f.read().splitlines()
+    data_pt = {"tmy_id": lines[0], "albedo": float(lines[1]), "tmy_loc_name": lines[3], "steps": float(lines[2])}
+    for line in lines[4:]:
+        #timing lines from profiled runs follow the results
+        if " produced by " in line:
+            total, tracker = line.strip().split(" produced by ")
+            data_pt[tracker] = float(total)
+    return data_pt
+
+def summary_files(folder):
+    return ["{}/{}".format(folder, file) for file in sorted(listdir(folder)) if file.endswith(".txt")]
+
+def load_results(folder, output=None, workers=None, chunksize=64):
     '''
-    Summarize all TXT files in a folder
+    Summarize all TXT files in a folder, parsed in parallel.
+
+    With output, the tidy table (see tidy_results) is also written there.
     '''
-    data = []
-    for file in listdir(folder):
-        if file.endswith(".txt"):
-            filepath="{}/{}".format(folder, file)
-            with open(filepath, 'r') as f:
-                lines = f.readlines()
-                data_pt = {"tmy_id":lines[0], "albedo": float(lines[1]), "tmy_loc_name": lines[3], "steps": float(lines[2])}
-                for line in lines[3:]:
-                    data_pt[line.split()[3]] = float(line.split()[0])
-                data.append(data_pt)
+    files = summary_files(folder)
+    if workers == 1 or len(files) < chunksize:
+        data = [read_summary(filepath) for filepath in files]
+    else:
+        with Pool(workers if workers is not None else cpu_count()) as p:
+            data = p.map(read_summary, files, chunksize=chunksize)
 
+    if output is not None:
+        write_table(tidy_results(data), output)
     return data
 
+def tidy_results(data):
+    '''
+    Wide summary dicts (load_results) -> DataFrame with TIDY_COLUMNS
+    '''
+    header = ("tmy_id", "albedo", "tmy_loc_name", "steps")
+    rows = [(data_pt["tmy_id"], data_pt["tmy_loc_name"], data_pt["albedo"], data_pt["steps"], tracker, energy)
+            for data_pt in data for tracker, energy in data_pt.items() if tracker not in header]
+    return pd.DataFrame(rows, columns=TIDY_COLUMNS)
+
+def load_store(root):
+    '''
+    Tidy table straight from a results_store root, no summaries to parse
+    '''
+    return read_scalars(root)[TIDY_COLUMNS]
+
+def relative_gain(tidy, baseline=BASELINE_TRACKER):
+    '''
+    Energy of every tracker relative to baseline for the same station and albedo,
+    (energy - baseline) / baseline. Cells without a baseline run are dropped.
+    '''
+    keys = ['station', 'albedo']
+    base = tidy.loc[tidy['tracker'] == baseline, keys + ['energy']].rename(columns={'energy': 'baseline_energy'})
+    out = tidy.merge(base, on=keys, how='inner')
+    out['relative_gain'] = (out['energy'] - out['baseline_energy']) / out['baseline_energy']
+    return out
+
+def grouped_stats(tidy, baseline=BASELINE_TRACKER):
+    '''
+    Relative gain vs baseline per tracker and albedo over all stations
+    '''
+    gains = relative_gain(tidy, baseline)
+    return gains.groupby(['tracker', 'albedo'])['relative_gain'].describe().reset_index()
 
+def write_table(df, path):
+    '''
+    Parquet for .parquet paths (needs pyarrow or fastparquet), CSV otherwise
+    '''
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def read_table(path):
+    '''
+    Reads a table written by write_table, so aggregation only has to run once
+    '''
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Aggregate simulation summaries into a tidy table.")
+    parser.add_argument("folder", nargs="?", default="../../plots/all_tmy")
+    parser.add_argument("output", nargs="?", default="../../plots/all_tmy_summary.csv", help=".parquet or .csv")
+    parser.add_argument("--store", action="store_true", help="folder is a results_store root instead of summaries")
+    parser.add_argument("--stats", default=None, help="also write relative gain statistics here")
+    parser.add_argument("--workers", type=int, default=None, help="pool size, defaults to the number of cores")
+    return parser.parse_args()
 
 if __name__=="__main__":
-    results = load_results("../../plots/all_tmy", "../../plots/all_tmy_summary.txt")
+    args = parse_args()
+    #built once, written and reused for the statistics
+    if args.store:
+        tidy = load_store(args.folder)
+    else:
+        tidy = tidy_results(load_results(args.folder, workers=args.workers))
+    write_table(tidy, args.output)
+    if args.stats is not None:
+        write_table(grouped_stats(tidy), args.stats)
@@ -0,0 +1,177 @@
+#offline benchmarks for the simulation hot paths, driven by the bundled TMY file
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmy_sim"))
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pvlib
+
+from tmy import load_station, tmy_step_to_OOMDP, run_sim_on_tracker
+from tmy_io import read_tmy
+from solar_geometry import compute_solar_geometry
+from energy_calcs import calculate_energy, calculate_energy_grid, energy_arrays
+from trackers import make_tracker, TRACKER_FACTORIES
+from run_tmy_folder import run_folder
+from instrumentation import Profiler, set_profiler
+from field_geometry import FieldGeometry, field_energy
+
+DATA_LOC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "722745TYA.CSV")
+
+def measure(fn, repeat=1):
+    '''
+    Runs fn repeat times. Returns best wall time (s) and the tracemalloc peak (bytes).
+
+    tracemalloc slows allocation heavy code down about twofold, so the timed runs
+    go without it and the peak comes from one more, separately traced run.
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+def commit_hash():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_stages(loc, albedo, repeat):
+    '''
+    Per stage timings, per call for the single step stages.
+    '''
+    stages = {}
+    cache_dir = tempfile.mkdtemp()
+    try:
+        stages['read_tmy_parse'] = measure(lambda: read_tmy(loc, cache_dir=cache_dir, use_cache=False), repeat)
+        read_tmy(loc, cache_dir=cache_dir)
+        stages['read_tmy_cached'] = measure(lambda: read_tmy(loc, cache_dir=cache_dir), repeat)
+    finally:
+        shutil.rmtree(cache_dir)
+
+    tmy_data, meta, sand_point, geometry = load_station(loc)
+    stages['solar_geometry_year'] = measure(lambda: compute_solar_geometry(tmy_data.index, sand_point.latitude, sand_point.longitude, sand_point.altitude), 1)
+
+    #a daytime step so every sub-model does real work
+    i = int(np.argmax(tmy_data['GHI'].values))
+    step_data = tmy_data.iloc[i:i+1]
+    solpos = geometry.iloc[i:i+1]
+    tracker = make_tracker('astro')
+
+    stages['tmy_step_to_OOMDP'] = measure(lambda: tmy_step_to_OOMDP(step_data, tracker, solpos, 0, albedo), repeat)
+    stages['calculate_energy_step'] = measure(lambda: calculate_energy(20., 90, albedo, step_data['Wspd'], step_data['DryBulb'], step_data.index, solpos,
+                                                                    step_data['DHI'], step_data['DNI'], step_data['GHI'], "bench"), repeat)
+    stages['calculate_energy_year'] = measure(lambda: calculate_energy(pd.Series(20., index=tmy_data.index), 90, albedo, tmy_data['Wspd'], tmy_data['DryBulb'], tmy_data.index, geometry,
+                                                                    tmy_data['DHI'], tmy_data['DNI'], tmy_data['GHI'], "bench"), repeat)
+    stages['energy_arrays_step'] = measure(lambda: energy_arrays(20., 90, albedo, float(step_data['Wspd'].iloc[0]), float(step_data['DryBulb'].iloc[0]), step_data.index.dayofyear[0],
+                                                                 float(solpos['apparent_zenith'].iloc[0]), float(solpos['azimuth'].iloc[0]),
+                                                                 float(step_data['DHI'].iloc[0]), float(step_data['DNI'].iloc[0]), float(step_data['GHI'].iloc[0])), repeat)
+    optimal = make_tracker('optimal')
+    stages['calculate_energy_grid_step'] = measure(lambda: calculate_energy_grid(optimal.configurations, 90, albedo, step_data['Wspd'], step_data['DryBulb'], step_data.index, solpos,
+                                                                              step_data['DHI'], step_data['DNI'], step_data['GHI']), repeat)
+
+    #row shading should cost about as much as the unshaded vectorized path
+    field = FieldGeometry(gcr=0.4)
+    stages['calculate_energy_grid_shaded_step'] = measure(lambda: calculate_energy_grid(optimal.configurations, 90, albedo, step_data['Wspd'], step_data['DryBulb'], step_data.index, solpos,
+                                                                                     step_data['DHI'], step_data['DNI'], step_data['GHI'], field=field), repeat)
+    stages['field_backtrack_year'] = measure(lambda: field.backtrack(geometry['apparent_zenith'].values, geometry['azimuth'].values), repeat)
+    rotation = np.nan_to_num(field.backtrack(geometry['apparent_zenith'].values, geometry['azimuth'].values))
+    stages['energy_arrays_year'] = measure(lambda: energy_arrays(rotation, 90, albedo, tmy_data['Wspd'].values, tmy_data['DryBulb'].values, tmy_data.index.dayofyear,
+                                                                 geometry['apparent_zenith'].values, geometry['azimuth'].values,
+                                                                 tmy_data['DHI'].values, tmy_data['DNI'].values, tmy_data['GHI'].values), repeat)
+    stages['field_energy_year'] = measure(lambda: field_energy(field, rotation, tmy_data, geometry, albedo), repeat)
+
+    return {name: {'seconds': t, 'peak_bytes': peak} for name, (t, peak) in stages.items()}
+
+def bench_trackers(loc, albedo, steps, trackers):
+    '''
+    steps/second of run_sim_on_tracker for each tracker, plus a profiled rerun
+    for the stage breakdown (kept separate so it does not skew steps/second).
+    '''
+    tmy_data, meta, sand_point, geometry = load_station(loc)
+    results = {}
+    for key in trackers:
+        tracker = make_tracker(key)
+        #a fresh tracker for every run, learning trackers would otherwise start the traced run trained
+        t, peak = measure(lambda: run_sim_on_tracker(make_tracker(key), tmy_data, sand_point, albedo, n_epochs=1, n_steps=steps, geometry=geometry))
+
+        profiler = Profiler()
+        previous = set_profiler(profiler)
+        try:
+            run_sim_on_tracker(make_tracker(key), tmy_data, sand_point, albedo, n_epochs=1, n_steps=steps, geometry=geometry)
+        finally:
+            set_profiler(previous)
+
+        results[key] = {'steps': steps, 'seconds': t, 'steps_per_second': steps / t, 'peak_bytes': peak,
+                        'batch': hasattr(tracker, 'get_angles'), 'stages': profiler.summary()}
+    return results
+
+def bench_folder(loc, steps, workers):
+    '''
+    Stations/second of run_folder on a folder holding a copy of the station.
+    '''
+    folder = tempfile.mkdtemp()
+    output = tempfile.mkdtemp()
+    try:
+        shutil.copy(loc, folder)
+        start = time.perf_counter()
+        run_folder(folder, output, steps, workers=workers, resume=False)
+        t = time.perf_counter() - start
+    finally:
+        shutil.rmtree(folder)
+        shutil.rmtree(output)
+    return {'stations': 1, 'steps': steps, 'workers': workers, 'seconds': t, 'stations_per_second': 1 / t}
+
+def run_benchmarks(loc=DATA_LOC, albedo=0.2, steps=500, trackers=None, repeat=3, workers=1, folder=True):
+    if trackers is None:
+        trackers = list(TRACKER_FACTORIES.keys())
+
+    results = {'commit': commit_hash(), 'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+               'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, 'pvlib': pvlib.__version__,
+               'tmy': os.path.basename(loc), 'albedo': albedo}
+    results['stages'] = bench_stages(loc, albedo, repeat)
+    results['trackers'] = bench_trackers(loc, albedo, steps, trackers)
+    if folder:
+        results['run_folder'] = bench_folder(loc, steps, workers)
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths on the bundled TMY file.")
+    parser.add_argument("--tmy", default=DATA_LOC)
+    parser.add_argument("--steps", type=int, default=500, help="steps simulated per tracker")
+    parser.add_argument("--albedo", type=float, default=0.2)
+    parser.add_argument("--trackers", nargs="+", default=None, help="tracker keys, defaults to all")
+    parser.add_argument("--repeat", type=int, default=3, help="repeats of the stage timings, best is kept")
+    parser.add_argument("--workers", type=int, default=1, help="pool size for the run_folder benchmark")
+    parser.add_argument("--skip-folder", action="store_true", help="skip the run_folder benchmark")
+    parser.add_argument("--output", default="benchmark_results.json")
+    return parser.parse_args()
+
+if __name__=="__main__":
+    args = parse_args()
+    results = run_benchmarks(args.tmy, args.albedo, args.steps, args.trackers, args.repeat, args.workers, not args.skip_folder)
+
+    for key, res in results['trackers'].items():
+        print("{:>8}: {:10.1f} steps/s".format(key, res['steps_per_second']))
+    for name, res in results['stages'].items():
+        print("{:>28}: {:.6f} s".format(name, res['seconds']))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
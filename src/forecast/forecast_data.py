@@ -0,0 +1,122 @@
+#forecast data layer: concurrent fetches of many sites/models, cached on disk by
+#(source, model, site, run time), with a local file stand-in for offline runs
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+#pvlib.forecast model classes by name, imported by RemoteSource (needs netCDF4 and siphon)
+FORECAST_MODELS = ('GFS', 'NAM', 'NDFD', 'HRRR', 'RAP')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".forecast_cache")
+#hours between two runs (cycles, from 00 UTC) of each model
+RUN_HOURS = {'GFS': 6, 'NAM': 6, 'NDFD': 1, 'HRRR': 1, 'RAP': 1}
+
+def latest_run(model, time):
+    '''
+    Time of the last run of model issued before time (UTC cycles of RUN_HOURS),
+    in the timezone of time.
+    '''
+    time = pd.Timestamp(time)
+    utc = time.tz_convert('UTC') if time.tz is not None else time
+    freq = "{}H".format(RUN_HOURS.get(model, 1))
+    run = utc.floor(freq)
+    if run == utc:
+        run -= pd.Timedelta(freq)
+    return run.tz_convert(time.tz) if time.tz is not None else run
+
+class ForecastRequest:
+    '''
+    One site from one model. run_time defaults to the latest run of the model
+    before start (latest_run).
+    '''
+    __slots__ = ('model', 'latitude', 'longitude', 'start', 'end', 'run_time')
+
+    def __init__(self, model, latitude, longitude, start, end, run_time=None):
+        self.model = model
+        self.latitude = latitude
+        self.longitude = longitude
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.run_time = pd.Timestamp(run_time) if run_time is not None else latest_run(model, self.start)
+
+    def key(self):
+        return "{}_{:.4f}_{:.4f}_{}_{}_{}".format(self.model, self.latitude, self.longitude,
+                                               *(time.tz_localize(None).strftime("%Y%m%dT%H%M") for time in (self.run_time, self.start, self.end)))
+
+class RemoteSource:
+    '''
+    pvlib.forecast models (THREDDS queries). pvlib.forecast is only imported
+    here, so the rest of this module works offline without its dependencies.
+    '''
+    name = 'remote'
+
+    def fetch(self, request):
+        import pvlib.forecast
+        if request.model not in FORECAST_MODELS:
+            raise ValueError("unknown forecast model {}, expected one of {}".format(request.model, FORECAST_MODELS))
+        model = getattr(pvlib.forecast, request.model)()
+        return model.get_processed_data(request.latitude, request.longitude, request.start, request.end)
+
+class LocalSource:
+    '''
+    Offline stand-in: serves <model>_<lat>_<lon>.csv files from folder (processed
+    data columns, datetime index in the first column), cut to the request window.
+    '''
+    def __init__(self, folder):
+        self.folder = folder
+        #cache namespace, one per folder
+        self.name = "local_{}".format(hashlib.sha1(os.path.abspath(folder).encode()).hexdigest()[:10])
+
+    def path(self, request):
+        return os.path.join(self.folder, "{}_{:.4f}_{:.4f}.csv".format(request.model, request.latitude, request.longitude))
+
+    def fetch(self, request):
+        data = pd.read_csv(self.path(request), index_col=0, parse_dates=True)
+        if data.index.tz is None:
+            data.index = data.index.tz_localize(request.start.tz)
+        return data[(data.index >= request.start) & (data.index <= request.end)]
+
+def _cache_path(request, source, cache_dir):
+    return os.path.join(cache_dir, source.name, "{}.pkl".format(request.key()))
+
+def fetch(request, source=None, cache_dir=CACHE_DIR, use_cache=True):
+    '''
+    Processed forecast data for request, from the cache if this (model, site,
+    run time, window) was fetched from the same source before.
+    '''
+    source = source or RemoteSource()
+    path = _cache_path(request, source, cache_dir)
+    if use_cache and os.path.exists(path):
+        return pd.read_pickle(path)
+
+    data = source.fetch(request)
+    if use_cache:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #write then rename so concurrent fetches never see a partial file
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        data.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    return data
+
+def fetch_many(requests, source=None, cache_dir=CACHE_DIR, use_cache=True, workers=8):
+    '''
+    Fetches requests concurrently (downloads are IO bound, threads are enough).
+    Returns {request.key(): DataFrame}.
+    '''
+    requests = list(requests)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda request: fetch(request, source, cache_dir, use_cache), requests)
+        return {request.key(): data for request, data in zip(requests, results)}
+
+def run_model_batch(mc, weather, surface_tilt=None):
+    '''
+    One ModelChain run over every timestamp of weather. surface_tilt may be a
+    per-timestamp sequence (e.g. tracker angles), it is aligned to the index.
+    '''
+    if surface_tilt is not None and np.ndim(surface_tilt) > 0:
+        mc.system.surface_tilt = pd.Series(np.asarray(surface_tilt, dtype=float), index=weather.index)
+    elif surface_tilt is not None:
+        mc.system.surface_tilt = surface_tilt
+    mc.run_model(weather.index, weather=weather)
+    return mc
@@ -2,6 +2,7 @@
 import pvlib
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import Matern, WhiteKernel, ConstantKernel, RationalQuadratic
+from scipy.interpolate import PchipInterpolator
 import numpy as np
 import pandas as pd
 import matplotlib
@@ -34,6 +35,162 @@ def interpolate_column(data, name, n_samples=500,):
     return inter_series
 
 
+COLUMNS = ['DHI', 'DNI', 'GHI', 'Wspd', 'DryBulb', 'TotCld', 'OpqCld']
+#interpolated as a clear-sky index, the rest with a monotone cubic
+IRRADIANCE_COLUMNS = ['DHI', 'DNI', 'GHI']
+#physical bounds applied after interpolation
+COLUMN_BOUNDS = {'DHI': (0, None), 'DNI': (0, None), 'GHI': (0, None), 'Wspd': (0, None), 'TotCld': (0, 10), 'OpqCld': (0, 10)}
+#clear-sky irradiance below this (W/m^2) gives no usable clear-sky index
+MIN_CLEARSKY = 10.
+MAX_CLEARSKY_INDEX = 1.5
+
+#stitched TMY years are laid out on this year, it has no Feb 29 (like TMY data)
+TMY_INDEX_YEAR = 1990
+HOURS_PER_YEAR = 8760
+
+def continuous_index(data):
+    '''
+    TMY rows are a continuous year stitched from different years, so the raw
+    index jumps at month boundaries (backwards, or forwards by whole years when
+    the months come from increasing years). Returns consecutive hours on
+    TMY_INDEX_YEAR from the first row's date and time, unless the index already
+    is consecutive hours. A stitched index must have HOURS_PER_YEAR rows.
+    '''
+    steps = np.diff(np.asarray(data.index.view('int64')))
+    if np.all(steps == pd.Timedelta(hours=1).value):
+        return data.index
+    if len(data) != HOURS_PER_YEAR:
+        raise ValueError("index is not consecutive hours and has {} rows, expected a {} hour TMY year".format(len(data), HOURS_PER_YEAR))
+    #the first row's own year may be a leap year, which would add a Feb 29
+    return pd.date_range(start=data.index[0].replace(year=TMY_INDEX_YEAR), periods=len(data), freq="H")
+
+def _hours(index, start):
+    return (index.view('int64') - start.value) / 3.6e12
+
+def clearsky_irradiance(index, location, columns):
+    '''
+    Simplified Solis clear-sky irradiance (no turbidity tables needed),
+    one column per name in columns.
+    '''
+    solpos = pvlib.solarposition.get_solarposition(index, location.latitude, location.longitude, altitude=location.altitude)
+    clearsky = pvlib.clearsky.simplified_solis(solpos['apparent_elevation'])
+    out = np.column_stack([np.asarray(clearsky[col.lower()], dtype=float) for col in columns])
+    return np.clip(np.nan_to_num(out), 0, None)
+
+def _clip(df):
+    for col, (low, high) in COLUMN_BOUNDS.items():
+        if col in df:
+            df[col] = df[col].clip(lower=low, upper=high)
+    return df
+
+def interpolate_solar(data, location, freq="T", columns=COLUMNS):
+    '''
+    Interpolates a whole station-year to freq in a few array passes.
+
+    Irradiance is interpolated as a clear-sky index (hour ending averages sit at
+    mid-hour) and multiplied by the clear-sky curve at the target resolution, so
+    it follows the shape of the sun instead of straight lines. Meteorological
+    columns use a monotone cubic (no overshoot). All columns are done together.
+    '''
+    index = continuous_index(data)
+    target = pd.date_range(start=index[0], end=index[-1], freq=freq)
+    start = index[0]
+    t_target = _hours(target, start)
+
+    out = pd.DataFrame(index=target)
+
+    irradiance = [col for col in columns if col in IRRADIANCE_COLUMNS]
+    if irradiance:
+        mid = index - pd.Timedelta(minutes=30)
+        t_mid = _hours(mid, start)
+        clearsky_mid = clearsky_irradiance(mid, location, irradiance)
+        clearsky_target = clearsky_irradiance(target, location, irradiance)
+
+        values = data[irradiance].values.astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            index_mid = np.where(clearsky_mid > MIN_CLEARSKY, values / clearsky_mid, np.nan)
+
+        index_target = np.zeros((len(target), len(irradiance)))
+        for j in range(len(irradiance)):
+            valid = ~np.isnan(index_mid[:, j])
+            if valid.any():
+                index_target[:, j] = np.interp(t_target, t_mid[valid], index_mid[valid, j])
+        index_target = np.clip(index_target, 0, MAX_CLEARSKY_INDEX)
+
+        for j, col in enumerate(irradiance):
+            out[col] = index_target[:, j] * clearsky_target[:, j]
+
+    met = [col for col in columns if col not in IRRADIANCE_COLUMNS]
+    if met:
+        spline = PchipInterpolator(_hours(index, start), data[met].values.astype(float), axis=0)
+        met_values = spline(t_target)
+        for j, col in enumerate(met):
+            out[col] = met_values[:, j]
+
+    return _clip(out[[col for col in columns]])
+
+def fit_gp_kernel(data, columns=COLUMNS, n_samples=500, kernel=None, n_restarts_optimizer=2):
+    '''
+    Fits GP hyperparameters once on the first n_samples hours, all columns
+    jointly (standardized). The returned kernel can be reused for every window
+    of interpolate_gp_windowed and for other stations.
+    '''
+    if kernel is None:
+        kernel = ConstantKernel() * Matern(length_scale=2, nu=3/2) + WhiteKernel()
+    index = continuous_index(data)
+    t = _hours(index[0:n_samples], index[0]).reshape(-1, 1)
+    y = data[columns].values[0:n_samples].astype(float)
+    y = (y - y.mean(axis=0)) / np.where(y.std(axis=0) > 0, y.std(axis=0), 1)
+
+    gpr = GaussianProcessRegressor(kernel=kernel, n_restarts_optimizer=n_restarts_optimizer)
+    gpr.fit(t, y)
+    return gpr.kernel_
+
+def interpolate_gp_windowed(data, kernel, freq="T", columns=COLUMNS, window=48, overlap=6):
+    '''
+    Local GP interpolation: one exact GP per window of hours (plus overlap on
+    each side) with fixed, pre-fitted hyperparameters, so a full year costs
+    n/window small solves instead of one O(n^3) solve.
+    '''
+    index = continuous_index(data)
+    target = pd.date_range(start=index[0], end=index[-1], freq=freq)
+    t_rows = _hours(index, index[0])
+    t_target = _hours(target, index[0])
+
+    y = data[columns].values.astype(float)
+    mean = y.mean(axis=0)
+    std = np.where(y.std(axis=0) > 0, y.std(axis=0), 1)
+    y = (y - mean) / std
+
+    out = np.zeros((len(target), len(columns)))
+    n = len(index)
+    for start in range(0, n, window):
+        lo, hi = max(0, start - overlap), min(n, start + window + overlap)
+        end = t_rows[start + window] if start + window < n else np.inf
+        targets = (t_target >= t_rows[start]) & (t_target < end)
+        if not targets.any():
+            continue
+        gpr = GaussianProcessRegressor(kernel=kernel, optimizer=None)
+        gpr.fit(t_rows[lo:hi].reshape(-1, 1), y[lo:hi])
+        out[targets] = gpr.predict(t_target[targets].reshape(-1, 1)).reshape(-1, len(columns))
+
+    return _clip(pd.DataFrame(out * std + mean, index=target, columns=columns))
+
+def interpolate_frame(data, freq="T", method="solar", location=None, kernel=None, columns=COLUMNS):
+    '''
+    Interpolates all columns of a station to freq.
+
+    method 'solar' (default) needs location, 'gp' uses a windowed local GP with
+    kernel (fitted with fit_gp_kernel if not given).
+    '''
+    if method == "solar":
+        return interpolate_solar(data, location, freq=freq, columns=columns)
+    if method == "gp":
+        if kernel is None:
+            kernel = fit_gp_kernel(data, columns=columns)
+        return interpolate_gp_windowed(data, kernel, freq=freq, columns=columns)
+    raise ValueError("unknown interpolation method {}".format(method))
+
 def run():
     loc = "/Users/edwardwilliams/Documents/research/heliotrope/simulations/data/722745TYA.CSV"
     tmy_data, meta = pvlib.tmy.readtmy3(filename=loc)
@@ -43,9 +200,11 @@ def run():
     n_samples = 500
 
     true = [tmy_data[col][tmy_data[col].index[0]:tmy_data[col].index[n_samples]] for col in cols_to_interpolate]
-    interpolated = [interpolate_column(tmy_data, col) for col in cols_to_interpolate]
 
-    df = pd.concat(interpolated, axis=1)
+    #the whole year at once, plotted over the same window as the exact GP used to
+    location = pvlib.location.Location(meta['latitude'], meta['longitude'], altitude=meta['altitude'])
+    year = interpolate_frame(tmy_data, freq="T", method="solar", location=location, columns=cols_to_interpolate)
+    df = year.iloc[0:n_samples*60 + 1]
     plt.figure(figsize=(50,50))
     df.plot();
     plt.savefig("interpolated_all.png")
@@ -0,0 +1,25 @@
+#shared fixtures for the pytest tests in this folder (the other scripts here are
+#standalone pvlib examples, not collected)
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmy_sim"))
+
+DATA_LOC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "722745TYA.CSV")
+
+collect_ignore = ['pvlib_test.py', 'stepped_simulation.py', 'pvlib_forecast.py']
+
+@pytest.fixture(scope='session')
+def station():
+    '''
+    (tmy_data, sand_point, geometry) of the bundled TMY3 station, read without
+    writing a cache next to the data.
+    '''
+    pytest.importorskip('pvlib')
+    import pvlib
+    from tmy_io import read_tmy
+    from solar_geometry import compute_solar_geometry
+    tmy_data, meta = read_tmy(DATA_LOC, use_cache=False)
+    sand_point = pvlib.location.Location(meta['latitude'], meta['longitude'], tz=meta['TZ'], altitude=meta['altitude'])
+    geometry = compute_solar_geometry(tmy_data.index, sand_point.latitude, sand_point.longitude, sand_point.altitude)
+    return tmy_data, sand_point, geometry
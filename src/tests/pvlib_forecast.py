@@ -1,22 +1,24 @@
 #running PVLib forecasting functions
 
-from pvlib.pvsystem import PVSystem, retrieve_sam
+from pvlib.pvsystem import PVSystem
 from pvlib.tracking import SingleAxisTracker
 from pvlib.modelchain import ModelChain
-from pvlib.forecast import GFS, NAM, NDFD, HRRR, RAP
+from pvlib.location import Location
 import pandas as pd
 import datetime
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmy_sim"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "forecast"))
+from components import get_module, get_inverter
+from forecast_data import ForecastRequest, fetch
 
-sandia_modules = retrieve_sam('sandiamod')
+module = get_module('Canadian_Solar_CS5P_220M___2009_')
 
-cec_inverters = retrieve_sam('cecinverter')
-
-module = sandia_modules['Canadian_Solar_CS5P_220M___2009_']
-
-inverter = cec_inverters['SMA_America__SC630CP_US_315V__CEC_2012_']
+inverter = get_inverter('SMA_America__SC630CP_US_315V__CEC_2012_')
 
 # system = SingleAxisTracker(module_parameters=module,
 #                             inverter_parameters=inverter,
@@ -38,16 +40,16 @@ irrad_vars = ['ghi', 'dni', 'dhi']
 
 # Global Forecast System (GFS), defaults to 0.5 degree resolution
 # 0.25 deg available
-model = GFS()
 
 #has raw data and processed data functions
 #NOTE: contains wind components (east/west and north/south!!!!)
 #NOTE: includes cloud cover modeling, by different cloud levels!
 #NOTE: how to generate images? do we even need those?
 
-data = model.get_processed_data(latitude, longitude, start, end)
+#cached on disk by (model, site, run time)
+data = fetch(ForecastRequest('GFS', latitude, longitude, start, end))
 
-mc = ModelChain(system, model.location)
+mc = ModelChain(system, Location(latitude, longitude, tz))
 
 print(data.index[0:2])
 
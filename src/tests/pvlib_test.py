@@ -9,13 +9,14 @@ import pvlib
 from pvlib.pvsystem import PVSystem
 from pvlib.location import Location
 from pvlib.modelchain import ModelChain
-
-# load some module and inverter specifications
-sandia_modules = pvlib.pvsystem.retrieve_sam('SandiaMod')
-cec_inverters = pvlib.pvsystem.retrieve_sam('cecinverter')
-
-sandia_module = sandia_modules['Canadian_Solar_CS5P_220M___2009_']
-cec_inverter = cec_inverters['ABB__MICRO_0_25_I_OUTD_US_208_208V__CEC_2014_']
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmy_sim"))
+from components import get_module, get_inverter
+
+# load some module and inverter specifications (cached, see components.py)
+sandia_module = get_module('Canadian_Solar_CS5P_220M___2009_')
+cec_inverter = get_inverter('ABB__MICRO_0_25_I_OUTD_US_208_208V__CEC_2014_')
 
 location = Location(latitude=32.2, longitude=-110.9)
 system = PVSystem(surface_tilt=20, surface_azimuth=200,
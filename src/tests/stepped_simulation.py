@@ -1,21 +1,26 @@
 #running PVLib simulation in steps
 
-from pvlib.pvsystem import PVSystem, retrieve_sam
+from pvlib.pvsystem import PVSystem
 from pvlib.tracking import SingleAxisTracker
 from pvlib.modelchain import ModelChain
-from pvlib.forecast import GFS, NAM, NDFD, HRRR, RAP
+from pvlib.location import Location
+import numpy as np
 import pandas as pd
 import datetime
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmy_sim"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "forecast"))
+from components import get_module, get_inverter
+from forecast_data import ForecastRequest, fetch, run_model_batch, LocalSource
 
 
 #set up system
-sandia_modules = retrieve_sam('sandiamod')
-cec_inverters = retrieve_sam('cecinverter')
-module = sandia_modules['Canadian_Solar_CS5P_220M___2009_']
-inverter = cec_inverters['SMA_America__SC630CP_US_315V__CEC_2012_']
+module = get_module('Canadian_Solar_CS5P_220M___2009_')
+inverter = get_inverter('SMA_America__SC630CP_US_315V__CEC_2012_')
 
 system = PVSystem(surface_tilt=20, surface_azimuth=200, module_parameters=module, inverter_parameters=inverter, modules_per_string=15, strings_per_inverter=300)
 
@@ -24,16 +29,17 @@ latitude, longitude, tz = 32.2, -110.9, 'US/Arizona'
 start = pd.Timestamp(datetime.date.today() - pd.Timedelta(days=20), tz=tz)
 
 end = start + pd.Timedelta(days=7)
-# model = GFS()
 
-model = NDFD()
+#FORECAST_DIR points at a folder of <model>_<lat>_<lon>.csv files for offline runs
+source = LocalSource(os.environ["FORECAST_DIR"]) if "FORECAST_DIR" in os.environ else None
 
-data = model.get_processed_data(latitude, longitude, start, end)
+#cached on disk by (model, site, run time), later runs do not download again
+data = fetch(ForecastRequest('NDFD', latitude, longitude, start, end), source=source)
 
-mc = ModelChain(system, model.location)
+mc = ModelChain(system, Location(latitude, longitude, tz))
 
-for dat in data.index:
-    mc.run_model(dat, weather=data)
-    mc.system.surface_tilt = randint(20, 40)
-    print(mc.system.surface_tilt)
-    print(mc.aoi)
+#one run over all timestamps, a new tilt per timestamp
+tilts = np.random.randint(20, 41, size=len(data.index))
+run_model_batch(mc, data, surface_tilt=tilts)
+print(mc.system.surface_tilt)
+print(mc.aoi)
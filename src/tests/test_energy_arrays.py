@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pvlib')
+import pandas as pd
+from energy_calcs import calculate_energy, energy_arrays
+from tmy import run_sim_on_tracker, tmy_to_frame
+from trackers import FixedPolicyTracker, AstroTracker
+
+#two days in summer, nights included
+STEPS = slice(4000, 4048)
+RTOL = 1e-6
+
+def check_against_calculate_energy(tmy_data, geometry, angles, albedo=0.2):
+    tilt = pd.Series(np.asarray(angles, dtype=float), index=tmy_data.index)
+    _, expected, _, pvtemps = calculate_energy(tilt, 90, albedo, tmy_data['Wspd'], tmy_data['DryBulb'], tmy_data.index, geometry,
+                                               tmy_data['DHI'], tmy_data['DNI'], tmy_data['GHI'], "test", save_data=False)
+    actual, parts = energy_arrays(tilt.values, 90, albedo, tmy_data['Wspd'].values, tmy_data['DryBulb'].values, tmy_data.index.dayofyear,
+                                  geometry['apparent_zenith'].values, geometry['azimuth'].values,
+                                  tmy_data['DHI'].values, tmy_data['DNI'].values, tmy_data['GHI'].values, breakdown=True)
+    np.testing.assert_allclose(actual, np.asarray(expected, dtype=float), rtol=RTOL, atol=1e-6, equal_nan=True)
+    np.testing.assert_allclose(parts['temp_cell'], np.asarray(pvtemps['temp_cell'], dtype=float), rtol=RTOL, equal_nan=True)
+
+@pytest.fixture
+def window(station):
+    tmy_data, sand_point, geometry = station
+    return tmy_data.iloc[STEPS], sand_point, geometry.iloc[STEPS]
+
+def test_fixed(window):
+    tmy_data, _, geometry = window
+    tracker = FixedPolicyTracker(30, 90)
+    check_against_calculate_energy(tmy_data, geometry, tracker.get_angles(tmy_data))
+
+@pytest.mark.parametrize('albedo', [0.2, 0.5])
+def test_astro(window, albedo):
+    tmy_data, _, geometry = window
+    tracker = AstroTracker(90, rng=np.random.RandomState(0))
+    angles = tracker.get_angles(tmy_to_frame(tmy_data, tracker, geometry, albedo))
+    check_against_calculate_energy(tmy_data, geometry, angles, albedo)
+
+@pytest.mark.parametrize('key', ['ucb', 'sarsa'])
+def test_learning(window, key):
+    pytest.importorskip('simple_rl')
+    from trackers import make_tracker
+    tmy_data, sand_point, geometry = window
+    np.random.seed(0)
+    tracker = make_tracker(key, rng=np.random.RandomState(0))
+    _, angles_df, _, _, _, _ = run_sim_on_tracker(tracker, tmy_data, sand_point, 0.2, n_epochs=1, n_steps=len(tmy_data),
+                                                  batch=False, geometry=geometry, save_data=False)
+    check_against_calculate_energy(tmy_data, geometry, angles_df.values[:, 0])
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pvlib')
+from tmy import run_sim_on_tracker, tmy_to_frame
+from trackers import AstroTracker, reward_oracle
+from state import TrackerState, features_from_frame, PREV_ANGLE
+
+N_STEPS = 72
+
+@pytest.fixture
+def astro_run(station):
+    tmy_data, sand_point, geometry = station
+    tracker = AstroTracker(90, rng=np.random.RandomState(0))
+    ac_df, angles_df, _, _, _, _ = run_sim_on_tracker(tracker, tmy_data, sand_point, 0.2, n_epochs=1, n_steps=N_STEPS,
+                                                      batch=False, geometry=geometry, save_data=False)
+    features = features_from_frame(tmy_to_frame(tmy_data.iloc[:N_STEPS], tracker, geometry.iloc[:N_STEPS], 0.2))
+    angles = angles_df.values[:, 0]
+    features[:, PREV_ANGLE] = np.concatenate(([0.], angles[:-1]))
+    return features, angles, ac_df['ac_step'].values, tmy_data.index[:N_STEPS]
+
+def test_matches_stepwise_rewards(astro_run):
+    features, angles, rewards, index = astro_run
+    np.testing.assert_allclose(reward_oracle(angles, features, 90, dayofyear=index.dayofyear), rewards, rtol=1e-9, equal_nan=True)
+
+def test_tracker_state(astro_run):
+    features, angles, rewards, index = astro_run
+    for i in (10, 14, 40):
+        state = TrackerState(features[i], datetime=np.asarray(index[i:i+1].view('int64')))
+        np.testing.assert_allclose(reward_oracle(angles[i], state, 90), rewards[i], rtol=1e-9)
+
+def test_candidate_grid(astro_run):
+    features, _, _, index = astro_run
+    candidates = np.linspace(-50, 50, 11)
+    grid = reward_oracle(candidates[:, None], features, 90, dayofyear=index.dayofyear)
+    assert grid.shape == (len(candidates), N_STEPS)
+    np.testing.assert_allclose(grid[3], reward_oracle(candidates[3], features, 90, dayofyear=index.dayofyear))
+
+def test_needs_dayofyear(astro_run):
+    features, angles, _, _ = astro_run
+    with pytest.raises(ValueError):
+        reward_oracle(angles, features, 90)
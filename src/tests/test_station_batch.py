@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pvlib')
+import pandas as pd
+from conftest import DATA_LOC
+from tmy_io import read_tmy
+from solar_geometry import GEOMETRY_COLUMNS, compute_solar_geometry
+from station_batch import StationBatch, batch_geometry
+
+def test_batch_geometry_matches_per_station():
+    tmy_data, meta = read_tmy(DATA_LOC, use_cache=False)
+    #the same weather at a second site, so stacking mixes coordinates
+    moved = dict(meta, latitude=float(meta['latitude']) + 10, longitude=float(meta['longitude']) - 20)
+    batch = StationBatch(['a', 'b'], [meta, moved], [tmy_data, tmy_data])
+
+    actual = batch.per_station(batch_geometry(batch)[GEOMETRY_COLUMNS].values.T)
+    utc = batch.per_station(batch.utc)
+    for i, station_meta in enumerate(batch.metas):
+        index = pd.DatetimeIndex(utc[i], tz='UTC')
+        expected = compute_solar_geometry(index, float(station_meta['latitude']), float(station_meta['longitude']), float(station_meta['altitude']))
+        np.testing.assert_allclose(actual[:, i], expected[GEOMETRY_COLUMNS].values.T, rtol=0, atol=1e-6, equal_nan=True)
@@ -0,0 +1,172 @@
+#sub-hourly simulation with an actuator model: weather interpolated to freq,
+#tracker targets followed under a rate limit and a deadband, motor energy
+#integrated over the resulting trajectory
+import os
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interpolation"))
+
+import numpy as np
+import pandas as pd
+from interpolate_tmy import interpolate_frame
+from tmy import tmy_to_frame, load_station
+from trackers import make_tracker
+from solar_geometry import compute_solar_geometry
+from energy_calcs import energy_arrays
+from field_geometry import field_energy
+from components import get_module, module_capacity
+from recorder import ResultRecorder, RADIATION_COLUMNS
+from instrumentation import get_profiler
+
+#runs of one target at least this long are settled step by step and then
+#filled at once (nights, fixed angles, plateaus of a discrete angle grid)
+SKIP_AFTER = 8
+
+def step_minutes(freq):
+    return pd.tseries.frequencies.to_offset(freq).nanos / 6e10
+
+class Actuator:
+    '''
+    Single-axis drive. Starts moving once the target is more than deadband
+    degrees away and then slews at max_rate (deg/min) until it is on target.
+
+    Motor energy per step is energy_per_deg_per_mw per degree travelled (the
+    energy_motion figure, i.e. constant power while slewing), plus
+    start_energy_per_mw (kWh) per start and standby_kw_per_mw while idle or not.
+    '''
+    def __init__(self, max_rate=6., deadband=0.5, limits=(-60, 60), energy_per_deg_per_mw=0.01, start_energy_per_mw=0., standby_kw_per_mw=0.):
+        self.max_rate = max_rate
+        self.deadband = deadband
+        self.limits = limits
+        self.energy_per_deg_per_mw = energy_per_deg_per_mw
+        self.start_energy_per_mw = start_energy_per_mw
+        self.standby_kw_per_mw = standby_kw_per_mw
+
+    def trajectory(self, targets, dt_minutes, start=0.):
+        '''
+        Position at the end of every step.
+
+        The deadband makes every step depend on the previous one, so varying
+        targets are followed one step at a time on plain floats. Within a run of
+        at least SKIP_AFTER equal targets (found with one array pass) the drive
+        is stepped only until it settles, it then holds for the rest of the run.
+        '''
+        max_step = self.max_rate*dt_minutes
+        deadband = self.deadband
+        targets = np.clip(np.asarray(targets, dtype=float), self.limits[0], self.limits[1])
+        values = targets.tolist()
+        n = len(values)
+        positions = [0.]*n
+
+        edges = np.flatnonzero(np.diff(targets)) + 1
+        run_starts, run_ends = np.concatenate(([0], edges)), np.concatenate((edges, [n]))
+        long_runs = run_ends - run_starts >= SKIP_AFTER
+
+        pos = float(start)
+        moving = False
+        i = 0
+        for run_start, run_end in zip(run_starts[long_runs].tolist() + [n], run_ends[long_runs].tolist() + [n]):
+            for j in range(i, run_start):
+                target = values[j]
+                error = target - pos
+                if moving or abs(error) > deadband:
+                    pos += max(-max_step, min(max_step, error))
+                    moving = pos != target
+                positions[j] = pos
+
+            j = run_start
+            while j < run_end and (moving or abs(values[j] - pos) > deadband):
+                target = values[j]
+                pos += max(-max_step, min(max_step, target - pos))
+                moving = pos != target
+                positions[j] = pos
+                j += 1
+            #settled on (or within the deadband of) a constant target
+            positions[j:run_end] = [pos]*(run_end - j)
+            i = run_end
+        return np.array(positions)
+
+    def motor_energy(self, positions, cap, dt_minutes, start=0.):
+        '''
+        Motor energy (kWh) of every step of a trajectory, cap in MW.
+        '''
+        travelled = np.abs(np.diff(positions, prepend=start))
+        moving = travelled > 0
+        starts = moving & ~np.concatenate(([False], moving[:-1]))
+        return cap*(travelled*self.energy_per_deg_per_mw + starts*self.start_energy_per_mw + self.standby_kw_per_mw*dt_minutes/60.)
+
+def subhourly_weather(tmy_data, sand_point, freq="5T"):
+    '''
+    TMY weather interpolated to freq, plus its solar geometry.
+    '''
+    weather = interpolate_frame(tmy_data, freq=freq, method="solar", location=sand_point)
+    geometry = compute_solar_geometry(weather.index, sand_point.latitude, sand_point.longitude, sand_point.altitude)
+    return weather, geometry
+
+def run_actuated(tracker, tmy_data, sand_point, albedo, freq="5T", actuator=None, weather=None, geometry=None, save_data=True):
+    '''
+    Sub-hourly run_sim_on_tracker for trackers with get_angles: their angles are
+    targets for the actuator, energy is computed at the actual positions.
+
+    ac in the results is energy per step (Wh, power times step length) net of
+    the motor energy, so sums compare with the hourly runs. Pass weather and
+    geometry (subhourly_weather) to reuse them across trackers. Trackers with a
+    field are scored with its orientation and row shading, like run_batch_on_tracker.
+    '''
+    if not hasattr(tracker, 'get_angles'):
+        raise ValueError("{} needs feedback every step, only trackers with get_angles can be actuated".format(tracker.name))
+    if actuator is None:
+        actuator = Actuator()
+    if weather is None:
+        weather, geometry = subhourly_weather(tmy_data, sand_point, freq)
+
+    profiler = get_profiler()
+    profiler.set_label(tracker.name)
+    profiler.count('steps', len(weather))
+    dt_minutes = step_minutes(freq)
+    cap = module_capacity(get_module())
+
+    with profiler.stage('state'):
+        frame = tmy_to_frame(weather, tracker, geometry, albedo)
+    with profiler.stage('get_angle'):
+        targets = np.asarray(tracker.get_angles(frame), dtype=float)
+    with profiler.stage('actuation'):
+        positions = actuator.trajectory(targets, dt_minutes)
+        motor = actuator.motor_energy(positions, cap, dt_minutes)
+
+    with profiler.stage('calculate_energy'):
+        if getattr(tracker, 'field', None) is not None:
+            ac, parts = field_energy(tracker.field, positions, weather, geometry, albedo, breakdown=True)
+        else:
+            ac, parts = energy_arrays(positions, tracker.get_azimuth(), albedo, weather['Wspd'].values, weather['DryBulb'].values, weather.index.dayofyear,
+                                      geometry['apparent_zenith'].values, geometry['azimuth'].values,
+                                      weather['DHI'].values, weather['DNI'].values, weather['GHI'].values, breakdown=True)
+
+    with profiler.stage('bookkeeping'):
+        recorder = ResultRecorder(weather.index, save_data=save_data)
+        recorder.record(slice(None), angle=positions, move_energy=motor,
+                        ac=ac*dt_minutes/60. - motor*1000, #kwh to wh
+                        temp_cell=parts['temp_cell'], temp_module=parts['temp_module'])
+        if save_data:
+            recorder.record_radiation(slice(None), np.column_stack([parts[name] for name in RADIATION_COLUMNS]))
+        return recorder.results(tracker)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sub-hourly simulation of trackers with a rate-limited, deadbanded drive.")
+    parser.add_argument("tmy")
+    parser.add_argument("--trackers", nargs="+", default=['fixed', 'astro', 'optimal'])
+    parser.add_argument("--freq", default="5T", help="simulation step, a pandas frequency")
+    parser.add_argument("--albedo", type=float, default=0.2)
+    parser.add_argument("--max-rate", type=float, default=6., help="deg/min")
+    parser.add_argument("--deadband", type=float, default=0.5, help="deg")
+    return parser.parse_args()
+
+if __name__=="__main__":
+    args = parse_args()
+    tmy_data, _, sand_point, _ = load_station(args.tmy)
+    weather, geometry = subhourly_weather(tmy_data, sand_point, args.freq)
+    actuator = Actuator(max_rate=args.max_rate, deadband=args.deadband)
+    for key in args.trackers:
+        tracker = make_tracker(key)
+        _, _, _, energy_consumed, _, total = run_actuated(tracker, tmy_data, sand_point, args.albedo, args.freq, actuator, weather, geometry, save_data=False)
+        print("{}: {:.1f} Wh net, motor {:.3f} kWh".format(tracker.name, total, energy_consumed.values.sum()))
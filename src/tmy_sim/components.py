@@ -0,0 +1,90 @@
+#module/inverter parameter library: each SAM database is parsed at most once
+#per process and the records actually used are cached on disk, so most
+#processes never parse the databases at all
+import os
+import json
+import pandas as pd
+from pvlib.pvsystem import retrieve_sam
+
+DEFAULT_MODULE = 'Canadian_Solar_CS5P_220M___2009_'
+DEFAULT_INVERTER = 'ABB__MICRO_0_25_I_OUTD_US_208_208V__CEC_2014_'
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".component_cache")
+
+#database name -> DataFrame, (database name, record name) -> Series
+_databases = {}
+_records = {}
+
+def get_database(database):
+    '''
+    Full SAM database ('sandiamod', 'cecinverter', ...), parsed once per process.
+    '''
+    if database not in _databases:
+        _databases[database] = retrieve_sam(database)
+    return _databases[database]
+
+def _record_path(database, name):
+    return os.path.join(CACHE_DIR, "{}__{}.json".format(database, name))
+
+def _to_json_value(value):
+    #numpy scalars -> python
+    return value.item() if hasattr(value, 'item') else value
+
+def get_component(database, name):
+    '''
+    One parameter record, same as retrieve_sam(database)[name].
+    '''
+    key = (database, name)
+    if key in _records:
+        return _records[key]
+
+    path = _record_path(database, name)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            record = pd.Series(json.load(f), name=name)
+    else:
+        record = get_database(database)[name]
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        #write then rename so parallel workers never see a partial file
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump({k: _to_json_value(v) for k, v in record.items()}, f)
+        os.replace(tmp_path, path)
+
+    _records[key] = record
+    return record
+
+def get_module(name=DEFAULT_MODULE):
+    return get_component('sandiamod', name)
+
+def get_inverter(name=DEFAULT_INVERTER):
+    return get_component('cecinverter', name)
+
+def module_capacity(module):
+    '''
+    Module capacity in MW, as used for the motion energy.
+    '''
+    return float(module['Isco']*module['Voco']/(10**6)) #convert to MW
+
+def export_records():
+    '''
+    Records loaded so far, for handing to worker processes (see install_records).
+    '''
+    return dict(_records)
+
+def install_records(records):
+    '''
+    Pool initializer: workers start with the parent's records instead of
+    re-reading them. With fork the records are inherited anyway, this covers spawn.
+    '''
+    _records.update(records)
+
+def preload(modules=(DEFAULT_MODULE,), inverters=(DEFAULT_INVERTER,)):
+    '''
+    Loads records in the parent before a Pool forks.
+    '''
+    for name in modules:
+        get_module(name)
+    for name in inverters:
+        get_inverter(name)
+    return export_records()
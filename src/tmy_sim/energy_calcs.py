@@ -1,14 +1,31 @@
 #calculate energy returned as a function of data and tracker angle
 import pvlib
 import pandas as pd
-from pvlib.pvsystem import PVSystem, retrieve_sam
+import numpy as np
+from pvlib.pvsystem import PVSystem
+from components import get_module, get_inverter
+from instrumentation import get_profiler
 
-sandia_modules = retrieve_sam('sandiamod')
-sapm_inverters = pvlib.pvsystem.retrieve_sam('cecinverter')
+#a, b, deltaT of the default sapm_celltemp model (open_rack_cell_glassback)
+SAPM_TEMP_OPEN_RACK = (-3.47, -.0594, 3)
 
-def calculate_energy(surface_tilt, surface_azimuth, albedo, wspd, drybulb, current_index, solpos, dhi, dni, ghi, tracker_name, save_data = True, module = sandia_modules['Canadian_Solar_CS5P_220M___2009_'],inverter = sapm_inverters['ABB__MICRO_0_25_I_OUTD_US_208_208V__CEC_2014_'] ):
-    dni_extra = pvlib.irradiance.extraradiation(current_index)
-    dni_extra = pd.Series(dni_extra, index=current_index)
+def calculate_energy(surface_tilt, surface_azimuth, albedo, wspd, drybulb, current_index, solpos, dhi, dni, ghi, tracker_name, save_data = True, module = None, inverter = None):
+    '''
+    module and inverter default to components.DEFAULT_MODULE/DEFAULT_INVERTER.
+
+    albedo may also be a sequence of albedos. The albedo independent part of the
+    chain (extraterrestrial dni, airmass, sky diffuse, aoi) is then computed once
+    and a dict albedo -> (sapm_out, ac, rad_timestep, pvtemps) is returned.
+    '''
+    if module is None:
+        module = get_module()
+    if inverter is None:
+        inverter = get_inverter()
+    profiler = get_profiler()
+
+    with profiler.stage('extraradiation'):
+        dni_extra = pvlib.irradiance.extraradiation(current_index)
+        dni_extra = pd.Series(dni_extra, index=current_index)
 
     # print(dni_extra)
 
@@ -16,19 +33,33 @@ def calculate_energy(surface_tilt, surface_azimuth, albedo, wspd, drybulb, curre
 
     # print(airmass)
 
-    poa_sky_diffuse = pvlib.irradiance.haydavies(surface_tilt, surface_azimuth,
-                                                 dhi, dni, dni_extra,
-                                                 solpos['apparent_zenith'], solpos['azimuth'])
+    with profiler.stage('haydavies'):
+        poa_sky_diffuse = pvlib.irradiance.haydavies(surface_tilt, surface_azimuth,
+                                                     dhi, dni, dni_extra,
+                                                     solpos['apparent_zenith'], solpos['azimuth'])
     # print(poa_sky_diffuse)
 
-    poa_ground_diffuse = pvlib.irradiance.grounddiffuse(surface_tilt, ghi, albedo=albedo)
+    with profiler.stage('aoi'):
+        aoi = pvlib.irradiance.aoi(surface_tilt, surface_azimuth, solpos['apparent_zenith'], solpos['azimuth'])
 
+    shared = (surface_tilt, wspd, drybulb, dni, ghi, dni_extra, airmass, poa_sky_diffuse, aoi, tracker_name, save_data, module, inverter)
+    if np.ndim(albedo) > 0:
+        return {float(a): _albedo_energy(a, *shared) for a in albedo}
+    return _albedo_energy(albedo, *shared)
 
-    aoi = pvlib.irradiance.aoi(surface_tilt, surface_azimuth, solpos['apparent_zenith'], solpos['azimuth'])
+def _albedo_energy(albedo, surface_tilt, wspd, drybulb, dni, ghi, dni_extra, airmass, poa_sky_diffuse, aoi, tracker_name, save_data, module, inverter):
+    '''
+    Albedo dependent part of calculate_energy: ground diffuse and everything downstream.
+    '''
+    profiler = get_profiler()
 
-    poa_irrad = pvlib.irradiance.globalinplane(aoi, dni, poa_sky_diffuse, poa_ground_diffuse)
+    with profiler.stage('globalinplane'):
+        poa_ground_diffuse = pvlib.irradiance.grounddiffuse(surface_tilt, ghi, albedo=albedo)
 
-    pvtemps = pvlib.pvsystem.sapm_celltemp(poa_irrad['poa_global'], wspd, drybulb)
+        poa_irrad = pvlib.irradiance.globalinplane(aoi, dni, poa_sky_diffuse, poa_ground_diffuse)
+
+    with profiler.stage('sapm_celltemp'):
+        pvtemps = pvlib.pvsystem.sapm_celltemp(poa_irrad['poa_global'], wspd, drybulb)
 
 
     rad_timestep = None
@@ -42,14 +73,157 @@ def calculate_energy(surface_tilt, surface_azimuth, albedo, wspd, drybulb, curre
 
 
 
-    effective_irradiance = pvlib.pvsystem.sapm_effective_irradiance(poa_irrad['poa_direct'], poa_irrad['poa_diffuse'], airmass, aoi, module)
+    with profiler.stage('sapm'):
+        effective_irradiance = pvlib.pvsystem.sapm_effective_irradiance(poa_irrad['poa_direct'], poa_irrad['poa_diffuse'], airmass, aoi, module)
 
-    sapm_out = pvlib.pvsystem.sapm(effective_irradiance, pvtemps.temp_cell, module)
+        sapm_out = pvlib.pvsystem.sapm(effective_irradiance, pvtemps.temp_cell, module)
 
-    ac =  pvlib.pvsystem.snlinverter(sapm_out['v_mp'], sapm_out['p_mp'], inverter)
+    with profiler.stage('snlinverter'):
+        ac =  pvlib.pvsystem.snlinverter(sapm_out['v_mp'], sapm_out['p_mp'], inverter)
 
     return sapm_out, ac, rad_timestep, pvtemps
 
+#pvlib defaults used by calculate_energy
+SOLAR_CONSTANT = 1366.1
+T0 = 25.
+Q_ELECTRON = 1.60218e-19
+K_BOLTZMANN = 1.38066e-23
+
+MODULE_KEYS = ('A0', 'A1', 'A2', 'A3', 'A4', 'B0', 'B1', 'B2', 'B3', 'B4', 'B5', 'FD', 'N', 'Cells_in_Series',
+               'Isco', 'Impo', 'Voco', 'Vmpo', 'Aisc', 'Aimp', 'C0', 'C1', 'C2', 'C3', 'Bvmpo', 'Mbvmp', 'Bvoco', 'Mbvoc')
+INVERTER_KEYS = ('Paco', 'Pdco', 'Vdco', 'Pso', 'C0', 'C1', 'C2', 'C3', 'Pnt')
+
+#(module name, inverter name) -> plain float coefficients, Series lookups are slow per step
+_coefficients = {}
+
+def chain_coefficients(module, inverter):
+    key = (module.name, inverter.name)
+    if key not in _coefficients:
+        _coefficients[key] = ({k: float(module[k]) for k in MODULE_KEYS}, {k: float(inverter[k]) for k in INVERTER_KEYS})
+    return _coefficients[key]
+
+def energy_arrays(surface_tilt, surface_azimuth, albedo, wspd, drybulb, dayofyear, apparent_zenith, azimuth, dhi, dni, ghi, module=None, inverter=None, breakdown=False, shaded_fraction=None):
+    '''
+    calculate_energy on plain floats/ndarrays: the pvlib 0.5 formulas of the same
+    chain (spencer extraradiation, kasten-young airmass, haydavies, isotropic
+    ground diffuse, open rack cell temperature, SAPM, SNL inverter) written out
+    with NumPy only. Inputs broadcast elementwise, dayofyear replaces the index.
+
+    Returns ac. With breakdown, returns (ac, parts) where parts holds the
+    radiation breakdown (dni_extra, sky_diffuse, ground_diffuse, poa_direct),
+    the temperatures (temp_cell, temp_module) and v_mp/p_mp.
+
+    shaded_fraction (0..1, broadcasting like the other inputs) removes that part
+    of the beam on the modules, see field_geometry. Diffuse light and the
+    electrical mismatch of partly shaded strings are not modelled.
+
+    Checked against calculate_energy by src/tests/test_energy_arrays.py.
+    '''
+    if module is None:
+        module = get_module()
+    if inverter is None:
+        inverter = get_inverter()
+    m, inv = chain_coefficients(module, inverter)
+    wspd, drybulb, dhi, dni, ghi = (np.asarray(values, dtype=float) for values in (wspd, drybulb, dhi, dni, ghi))
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        b = (2.*np.pi/365.)*(np.asarray(dayofyear, dtype=float) - 1)
+        dni_extra = SOLAR_CONSTANT*(1.00011 + 0.034221*np.cos(b) + 0.00128*np.sin(b) + 0.000719*np.cos(2*b) + 0.000077*np.sin(2*b))
+
+        zenith = np.asarray(apparent_zenith, dtype=float)
+        zenith_rad = np.radians(zenith)
+        airmass = 1.0/(np.cos(zenith_rad) + 0.50572*((6.07995 + (90 - zenith))**-1.6364))
+        airmass = np.where(zenith > 90, np.nan, airmass)
+
+        tilt_rad = np.radians(surface_tilt)
+        cos_tilt = np.cos(tilt_rad)
+        projection = cos_tilt*np.cos(zenith_rad) + np.sin(tilt_rad)*np.sin(zenith_rad)*np.cos(np.radians(np.asarray(azimuth, dtype=float) - surface_azimuth))
+        aoi = np.degrees(np.arccos(projection))
+
+        #haydavies
+        ai = dni/dni_extra
+        sky_diffuse = np.maximum(dhi*(ai*projection/np.cos(zenith_rad) + (1 - ai)*0.5*(1 + cos_tilt)), 0)
+        ground_diffuse = ghi*albedo*(1 - cos_tilt)*0.5
+
+        poa_direct = np.maximum(dni*np.cos(np.radians(aoi)), 0)
+        if shaded_fraction is not None:
+            poa_direct = poa_direct*(1 - np.asarray(shaded_fraction, dtype=float))
+        poa_diffuse = sky_diffuse + ground_diffuse
+        poa_global = poa_direct + poa_diffuse
+
+        a, b_temp, delta_t = SAPM_TEMP_OPEN_RACK
+        temp_module = poa_global*np.exp(a + b_temp*wspd) + drybulb
+        temp_cell = temp_module + poa_global/1000.*delta_t
+
+        #sapm_effective_irradiance, relative airmass as in calculate_energy
+        spectral_loss = np.polyval([m['A4'], m['A3'], m['A2'], m['A1'], m['A0']], airmass)
+        spectral_loss = np.maximum(0, np.where(np.isnan(spectral_loss), 0, spectral_loss))
+        aoi_loss = np.clip(np.polyval([m['B5'], m['B4'], m['B3'], m['B2'], m['B1'], m['B0']], aoi), 0, None)
+        aoi_loss = np.where(aoi < 0, 0, aoi_loss)
+        ee = spectral_loss*(poa_direct*aoi_loss + m['FD']*poa_diffuse)/1000.
+
+        #sapm, only what the inverter needs
+        delta = m['N']*K_BOLTZMANN*(temp_cell + 273.15)/Q_ELECTRON
+        log_ee = np.log(ee)
+        bvmpo = m['Bvmpo'] + m['Mbvmp']*(1 - ee)
+        i_mp = m['Impo']*(m['C0']*ee + m['C1']*(ee**2))*(1 + m['Aimp']*(temp_cell - T0))
+        v_mp = np.maximum(0, m['Vmpo'] + m['C2']*m['Cells_in_Series']*delta*log_ee + m['C3']*m['Cells_in_Series']*((delta*log_ee)**2) + bvmpo*(temp_cell - T0))
+        p_mp = i_mp*v_mp
+
+        #snlinverter
+        v_delta = v_mp - inv['Vdco']
+        big_a = inv['Pdco']*(1 + inv['C1']*v_delta)
+        big_b = inv['Pso']*(1 + inv['C2']*v_delta)
+        big_c = inv['C0']*(1 + inv['C3']*v_delta)
+        ac = (inv['Paco']/(big_a - big_b) - big_c*(big_a - big_b))*(p_mp - big_b) + big_c*((p_mp - big_b)**2)
+        ac = np.minimum(inv['Paco'], ac)
+        ac = np.where(p_mp < inv['Pso'], -1.0*abs(inv['Pnt']), ac)
+
+    if not breakdown:
+        return ac
+    shape = np.shape(ac)
+    parts = {'dni_extra': np.broadcast_to(dni_extra, shape), 'sky_diffuse': sky_diffuse, 'ground_diffuse': ground_diffuse, 'poa_direct': poa_direct,
+             'temp_cell': temp_cell, 'temp_module': temp_module, 'v_mp': v_mp, 'p_mp': p_mp}
+    return ac, parts
+
+def calculate_energy_grid(surface_tilts, surface_azimuth, albedo, wspd, drybulb, current_index, solpos, dhi, dni, ghi, module = None, inverter = None, field = None):
+    '''
+    Same model chain as calculate_energy, broadcast over candidate tilts.
+
+    surface_tilts is either a 1d array of candidates (scored at every step) or a
+    (candidates x steps) array of per-step candidates. Weather and sun inputs are
+    per step. Returns ac power as a (candidates x steps) ndarray.
+
+    With a sequence of albedos the result gains a leading albedo axis
+    (albedos x candidates x steps); only ground diffuse and what follows it is
+    evaluated per albedo.
+
+    With field (a field_geometry.FieldGeometry) the candidates are rotations in
+    that field: surface_azimuth is replaced by the field orientation and row
+    shading reduces the beam.
+    '''
+    if module is None:
+        module = get_module()
+    if inverter is None:
+        inverter = get_inverter()
+
+    tilt = np.asarray(surface_tilts, dtype=float)
+    if tilt.ndim < 2:
+        tilt = tilt.reshape(-1, 1)
+    albedo = np.asarray(albedo, dtype=float)
+    if albedo.ndim > 0:
+        albedo = albedo.reshape(-1, 1, 1)
+
+    #plain 1d arrays over time broadcast against the candidate axis
+    ravel = lambda values: np.asarray(values, dtype=float).ravel()
+    apparent_zenith, azimuth = ravel(solpos['apparent_zenith']), ravel(solpos['azimuth'])
+    shaded_fraction = None
+    if field is not None:
+        shaded_fraction = field.shaded_fraction(tilt, apparent_zenith, azimuth)
+        tilt, surface_azimuth = field.surface_orientation(tilt)
+    return energy_arrays(tilt, surface_azimuth, albedo, ravel(wspd), ravel(drybulb), ravel(pd.DatetimeIndex(current_index).dayofyear),
+                         apparent_zenith, azimuth, ravel(dhi), ravel(dni), ravel(ghi), module=module, inverter=inverter, shaded_fraction=shaded_fraction)
+
 def energy_motion(start, end, cap, energy_per_deg_per_mw = 0.01):
     '''
     energy_per_deg_per_mw = energy consumed in Kwh per mw per degree when moving
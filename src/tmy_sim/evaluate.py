@@ -0,0 +1,84 @@
+#multi-seed evaluation: R independently seeded runs of n_epochs each, spread
+#over a Pool, aggregated into per-epoch learning curves with confidence intervals
+import argparse
+import random
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from scipy import stats
+from tmy import load_station, run_sim_on_tracker, DEFAULT_TRACKERS
+from trackers import make_tracker
+from components import preload, install_records
+
+def _evaluate_run(args):
+    '''
+    One seed: total energy of every epoch. Learning carries over between epochs.
+    '''
+    loc, tracker_key, seed, albedo, n_epochs, n_steps = args
+    #simple_rl agents draw from the global random/np.random state
+    random.seed(seed)
+    np.random.seed(seed)
+    tracker = make_tracker(tracker_key, rng=np.random.RandomState(seed))
+
+    #memory-mapped from the caches the parent filled, shared between workers
+    tmy_data, _, sand_point, geometry = load_station(loc)
+    if n_steps == "max":
+        n_steps = len(tmy_data.index)
+
+    totals = [run_sim_on_tracker(tracker, tmy_data, sand_point, albedo, n_epochs=1, n_steps=n_steps, geometry=geometry, save_data=False)[5]
+              for _ in range(n_epochs)]
+    return tracker_key, seed, totals
+
+def learning_curves(runs, confidence=0.95):
+    '''
+    (seeds x epochs) totals -> per epoch mean, std and Student t confidence interval.
+    '''
+    runs = np.asarray(runs, dtype=float)
+    n = runs.shape[0]
+    mean = runs.mean(axis=0)
+    std = runs.std(axis=0, ddof=1) if n > 1 else np.zeros_like(mean)
+    half_width = stats.t.ppf(0.5 + confidence/2, n - 1)*std/np.sqrt(n) if n > 1 else np.zeros_like(mean)
+    return pd.DataFrame({'epoch': np.arange(runs.shape[1]), 'mean': mean, 'std': std,
+                         'ci_low': mean - half_width, 'ci_high': mean + half_width, 'seeds': n})
+
+def evaluate(loc, trackers=None, seeds=range(10), albedo=0.2, n_epochs=10, n_steps="max", workers=None, confidence=0.95):
+    '''
+    Runs every tracker once per seed, n_epochs epochs each, on a Pool.
+    Returns ({tracker key: (seeds x epochs) totals}, learning curves DataFrame).
+    '''
+    if trackers is None:
+        trackers = DEFAULT_TRACKERS
+    seeds = list(seeds)
+
+    #fill the TMY and geometry caches once, workers then map them
+    load_station(loc)
+    records = preload()
+
+    tasks = [(loc, key, seed, albedo, n_epochs, n_steps) for key in trackers for seed in seeds]
+    with Pool(workers, initializer=install_records, initargs=(records,)) as p:
+        results = p.map(_evaluate_run, tasks)
+
+    #ordered by seed, so results do not depend on scheduling
+    runs = {key: np.array([totals for _, _, totals in sorted(r for r in results if r[0] == key)]) for key in trackers}
+    curves = pd.concat([learning_curves(totals, confidence).assign(tracker=key) for key, totals in runs.items()], ignore_index=True)
+    return runs, curves
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seeded multi-epoch evaluation of trackers on one station.")
+    parser.add_argument("tmy")
+    parser.add_argument("output", nargs="?", default="learning_curves.csv")
+    parser.add_argument("--trackers", nargs="+", default=DEFAULT_TRACKERS)
+    parser.add_argument("--seeds", type=int, default=10, help="number of seeds, 0..SEEDS-1")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--steps", default="max", help="steps per epoch, or 'max'")
+    parser.add_argument("--albedo", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=None, help="pool size, defaults to the number of cores")
+    args = parser.parse_args()
+    if args.steps != "max":
+        args.steps = int(args.steps)
+    return args
+
+if __name__=="__main__":
+    args = parse_args()
+    _, curves = evaluate(args.tmy, args.trackers, range(args.seeds), args.albedo, args.epochs, args.steps, args.workers)
+    curves.to_csv(args.output, index=False)
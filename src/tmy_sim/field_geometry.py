@@ -0,0 +1,102 @@
+#row-to-row geometry of a single-axis tracker field: true-tracking and
+#backtracking rotations and the shaded fraction of a row, as arrays over any
+#number of steps instead of one pvlib.tracking.singleaxis call per hour
+import numpy as np
+from energy_calcs import energy_arrays
+
+class FieldGeometry:
+    '''
+    Rows of row_width on a pitch of row_pitch (or directly a ground coverage
+    ratio gcr = row_width/row_pitch), rotating about an axis tilted axis_tilt
+    degrees down towards axis_azimuth.
+
+    Rotations use the tracker angle convention of this repo: positive faces the
+    modules towards axis_azimuth + 90 (east for a north-south axis), so on a
+    horizontal axis a rotation is the surface tilt at that surface azimuth.
+    Shading is that of an interior row by its neighbour, in the plane
+    perpendicular to the axis.
+    '''
+    def __init__(self, gcr=None, row_pitch=None, row_width=2., axis_tilt=0., axis_azimuth=0., max_angle=90.):
+        if gcr is None:
+            if row_pitch is None:
+                raise ValueError("FieldGeometry needs gcr or row_pitch")
+            gcr = row_width/row_pitch
+        if not 0 < gcr < 1:
+            raise ValueError("gcr must be between 0 and 1, got {}".format(gcr))
+        self.gcr = float(gcr)
+        self.axis_tilt = float(axis_tilt)
+        self.axis_azimuth = float(axis_azimuth)
+        self.max_angle = float(max_angle)
+
+    def __repr__(self):
+        #stable, it is part of the result cache key of trackers holding a field
+        return "FieldGeometry(gcr={!r}, axis_tilt={!r}, axis_azimuth={!r}, max_angle={!r})".format(self.gcr, self.axis_tilt, self.axis_azimuth, self.max_angle)
+
+    def true_tracking(self, apparent_zenith, azimuth):
+        '''
+        Rotation facing the sun (the sun's projection on the plane perpendicular
+        to the axis), nan while the sun is down.
+        '''
+        zenith = np.asarray(apparent_zenith, dtype=float)
+        zenith_rad = np.radians(zenith)
+        relative = np.radians(np.asarray(azimuth, dtype=float) - self.axis_azimuth)
+        axis_tilt = np.radians(self.axis_tilt)
+        omega = np.degrees(np.arctan2(np.sin(zenith_rad)*np.sin(relative),
+                                      np.sin(zenith_rad)*np.cos(relative)*np.sin(axis_tilt) + np.cos(zenith_rad)*np.cos(axis_tilt)))
+        return np.where(zenith < 90, omega, np.nan)
+
+    def _backtrack(self, omega):
+        with np.errstate(invalid='ignore'):
+            #0 while the rows do not shade each other at true tracking
+            correction = np.degrees(np.arccos(np.clip(np.cos(np.radians(omega))/self.gcr, -1, 1)))
+            return np.clip(omega - np.sign(omega)*correction, -self.max_angle, self.max_angle)
+
+    def backtrack(self, apparent_zenith, azimuth):
+        '''
+        Backtracking rotation: true tracking, turned back towards flat just
+        enough that the rows stop shading each other. nan while the sun is down.
+        '''
+        return self._backtrack(self.true_tracking(apparent_zenith, azimuth))
+
+    def _shaded_fraction(self, rotation, omega):
+        rotation = np.asarray(rotation, dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cos_incidence = np.cos(np.radians(rotation - omega))
+            shaded = 1 - np.cos(np.radians(omega))/(self.gcr*cos_incidence)
+            #sun behind the modules or down: no beam to shade
+            shaded = np.where((cos_incidence > 0) & ~np.isnan(omega), shaded, 0)
+        return np.clip(shaded, 0, 1)
+
+    def shaded_fraction(self, rotation, apparent_zenith, azimuth):
+        '''
+        Fraction of the row width in its neighbour's shadow at rotation. rotation
+        broadcasts against the sun inputs, e.g. (candidates x steps).
+        '''
+        return self._shaded_fraction(rotation, self.true_tracking(apparent_zenith, azimuth))
+
+    def surface_orientation(self, rotation):
+        '''
+        (surface_tilt, surface_azimuth) of the modules at rotation, as energy_arrays
+        takes them. On a horizontal axis that is the signed rotation itself.
+        '''
+        if self.axis_tilt == 0:
+            return np.asarray(rotation, dtype=float), self.axis_azimuth + 90
+        theta = np.radians(np.asarray(rotation, dtype=float))
+        axis_tilt, axis_azimuth = np.radians(self.axis_tilt), np.radians(self.axis_azimuth)
+        #module normal: the axis normal tilted towards axis_azimuth, rotated towards axis_azimuth + 90
+        n_x = np.sin(axis_azimuth)*np.sin(axis_tilt)*np.cos(theta) + np.cos(axis_azimuth)*np.sin(theta)
+        n_y = np.cos(axis_azimuth)*np.sin(axis_tilt)*np.cos(theta) - np.sin(axis_azimuth)*np.sin(theta)
+        n_z = np.cos(axis_tilt)*np.cos(theta)
+        return np.degrees(np.arccos(np.clip(n_z, -1, 1))), np.degrees(np.arctan2(n_x, n_y)) % 360
+
+def field_energy(field, rotation, tmy_data, geometry, albedo, module=None, inverter=None, breakdown=False):
+    '''
+    energy_arrays for a whole series of rotations in the field, with the beam
+    on the modules reduced by the row shading. Same return value as energy_arrays.
+    '''
+    apparent_zenith, azimuth = geometry['apparent_zenith'].values, geometry['azimuth'].values
+    shaded = field.shaded_fraction(rotation, apparent_zenith, azimuth)
+    surface_tilt, surface_azimuth = field.surface_orientation(rotation)
+    return energy_arrays(surface_tilt, surface_azimuth, albedo, tmy_data['Wspd'].values, tmy_data['DryBulb'].values, tmy_data.index.dayofyear,
+                         apparent_zenith, azimuth, tmy_data['DHI'].values, tmy_data['DNI'].values, tmy_data['GHI'].values,
+                         module=module, inverter=inverter, breakdown=breakdown, shaded_fraction=shaded)
@@ -0,0 +1,134 @@
+#opt-in stage timers and counters for the simulation loop
+import os
+import time
+import cProfile
+
+class _Stage:
+    __slots__ = ('timings', 'key', 'start')
+
+    def __init__(self, timings, key):
+        self.timings = timings
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        entry = self.timings.get(self.key)
+        if entry is None:
+            self.timings[self.key] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+        return False
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class Profiler:
+    '''
+    Cumulative wall time, call counts and counters per (tracker, stage).
+    The tracker is whatever label was set last (run_sim_on_tracker sets it).
+    '''
+    enabled = True
+
+    def __init__(self):
+        self.label = ""
+        self.timings = {}
+        self.counters = {}
+
+    def set_label(self, label):
+        self.label = label
+
+    def stage(self, name):
+        return _Stage(self.timings, (self.label, name))
+
+    def count(self, name, n=1):
+        key = (self.label, name)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def summary(self):
+        '''
+        {tracker: {stage: {'calls': n, 'seconds': s}, 'counters': {...}}}
+        '''
+        out = {}
+        for (label, name), (calls, seconds) in self.timings.items():
+            out.setdefault(label, {})[name] = {'calls': calls, 'seconds': seconds}
+        for (label, name), n in self.counters.items():
+            out.setdefault(label, {}).setdefault('counters', {})[name] = n
+        return out
+
+    def summary_lines(self):
+        lines = []
+        for (label, name), (calls, seconds) in sorted(self.timings.items()):
+            lines.append("{:.6f} s in {} by {} ({} calls)".format(seconds, name, label, calls))
+        return lines
+
+class NullProfiler:
+    '''
+    Disabled profiler, every hook is a no-op.
+    '''
+    enabled = False
+    label = ""
+
+    def set_label(self, label):
+        pass
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def count(self, name, n=1):
+        pass
+
+    def summary(self):
+        return {}
+
+    def summary_lines(self):
+        return []
+
+NULL_PROFILER = NullProfiler()
+
+_active = NULL_PROFILER
+
+def get_profiler():
+    return _active
+
+def set_profiler(profiler):
+    '''
+    Makes profiler the active one (None disables). Returns the previous one.
+    '''
+    global _active
+    previous = _active
+    _active = profiler if profiler is not None else NULL_PROFILER
+    return previous
+
+#one cProfile per worker process, dumped after every task since Pool has no exit hook
+_worker_profile = None
+
+def enable_worker_cprofile():
+    global _worker_profile
+    if _worker_profile is None:
+        _worker_profile = cProfile.Profile()
+    _worker_profile.enable()
+
+def dump_worker_cprofile(folder):
+    '''
+    Writes this worker's accumulated pstats to folder/worker_<pid>.pstats.
+    '''
+    if _worker_profile is None:
+        return None
+    _worker_profile.disable()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "worker_{}.pstats".format(os.getpid()))
+    _worker_profile.dump_stats(path)
+    return path
@@ -0,0 +1,194 @@
+#streaming simulation: weather chunks -> solar geometry -> tracker decisions ->
+#energy -> incremental writer. Only one chunk is in memory at a time, so
+#minute-level or multi-year inputs run in bounded memory.
+import os
+import numpy as np
+import pandas as pd
+from tmy import tmy_to_frame
+from tmy_io import read_tmy
+from solar_geometry import compute_solar_geometry
+from state import TrackerState, features_from_frame, PREV_ANGLE
+from energy_calcs import calculate_energy, energy_arrays, energy_motion
+from components import get_module, module_capacity
+from recorder import ResultRecorder
+from instrumentation import get_profiler
+
+#one week of minute data
+DEFAULT_CHUNK_SIZE = 7*24*60
+
+class Carry:
+    '''
+    Tracker state carried across chunk boundaries. Agent weights live in the
+    tracker itself, which is reused for every chunk.
+    '''
+    __slots__ = ('old_tilt', 'prev_reward', 'steps', 'total', 'step_hours')
+
+    def __init__(self):
+        self.old_tilt = 0.
+        self.prev_reward = 0.
+        self.steps = 0
+        #energy (Wh) produced so far, ac power integrated over the step length
+        self.total = 0.
+        self.step_hours = 1.
+
+def step_hours(index, carry):
+    '''
+    Step length of a chunk in hours (median spacing of its index). A one-row
+    chunk keeps the step length of the previous chunk.
+    '''
+    if len(index) > 1:
+        carry.step_hours = float(np.median(np.diff(np.asarray(index.view('int64')))))/3.6e12
+    return carry.step_hours
+
+def weather_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Fixed-size windows of weather. source is a DataFrame (e.g. the minute series
+    of interpolate_tmy) or any iterable of DataFrames, which are re-cut to
+    chunk_size rows.
+    '''
+    if isinstance(source, pd.DataFrame):
+        source = [source]
+
+    pending = []
+    n_pending = 0
+    for frame in source:
+        for start in range(0, len(frame), chunk_size):
+            piece = frame.iloc[start:start + chunk_size]
+            pending.append(piece)
+            n_pending += len(piece)
+            while n_pending >= chunk_size:
+                chunk = pd.concat(pending) if len(pending) > 1 else pending[0]
+                yield chunk.iloc[0:chunk_size]
+                rest = chunk.iloc[chunk_size:]
+                pending = [rest] if len(rest) else []
+                n_pending = len(rest)
+    if n_pending:
+        yield pd.concat(pending) if len(pending) > 1 else pending[0]
+
+def tmy_chunks(locs, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Weather chunks over several TMY files back to back (multi-year runs).
+    '''
+    return weather_chunks((read_tmy(loc)[0] for loc in locs), chunk_size)
+
+def csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Weather chunks streamed from a CSV with a datetime index in the first column.
+    '''
+    reader = pd.read_csv(path, index_col=0, parse_dates=True, chunksize=chunk_size)
+    return weather_chunks(reader, chunk_size)
+
+def with_geometry(chunks, sand_point):
+    '''
+    Adds solar geometry to every weather chunk.
+    '''
+    for weather in chunks:
+        with get_profiler().stage('solar_geometry'):
+            geometry = compute_solar_geometry(weather.index, sand_point.latitude, sand_point.longitude, sand_point.altitude)
+        yield weather, geometry
+
+def tracker_decisions(chunks, tracker, albedo, carry, cap):
+    '''
+    Adds the tracker angles to every chunk, and the angle the tracker starts
+    the chunk from. Feedback trackers step through the chunk with the reward of
+    their previous move, continuing from carry. Only this stage advances
+    carry.old_tilt, so later stages may run ahead or behind it.
+    '''
+    surface_azimuth = tracker.get_azimuth()
+    for weather, geometry in chunks:
+        with get_profiler().stage('state'):
+            frame = tmy_to_frame(weather, tracker, geometry, albedo)
+
+        start_tilt = carry.old_tilt
+        if hasattr(tracker, 'get_angles'):
+            with get_profiler().stage('get_angle'):
+                angles = np.asarray(tracker.get_angles(frame), dtype=float)
+            if len(angles):
+                carry.old_tilt = float(angles[-1])
+            yield weather, geometry, angles, start_tilt
+            continue
+
+        hours = step_hours(weather.index, carry)
+        features = features_from_frame(frame)
+        datetimes = np.asarray(weather.index.view('int64'))
+        dayofyear = np.asarray(weather.index.dayofyear)
+        inputs = {col: np.asarray(frame[col].values, dtype=float) for col in ['Wspd', 'DryBulb', 'DHI', 'DNI', 'GHI', 'apparent_zenith', 'azimuth']}
+        angles = np.zeros(len(weather))
+        old_tilt, prev_reward = carry.old_tilt, carry.prev_reward
+        for i in range(len(weather)):
+            data = features[i].copy()
+            data[PREV_ANGLE] = old_tilt
+            state = TrackerState(data, datetime=datetimes[i:i+1])
+            with get_profiler().stage('get_angle'):
+                angles[i] = float(tracker.get_angle(state, prev_reward))
+
+            ac = energy_arrays(angles[i], surface_azimuth, albedo, inputs['Wspd'][i], inputs['DryBulb'][i], dayofyear[i],
+                               inputs['apparent_zenith'][i], inputs['azimuth'][i], inputs['DHI'][i], inputs['DNI'][i], inputs['GHI'][i])
+            #energy of the step (Wh), like the recorded ac
+            prev_reward = float(ac)*hours - energy_motion(old_tilt, angles[i], cap)*1000
+            old_tilt = angles[i]
+        carry.old_tilt, carry.prev_reward = float(old_tilt), prev_reward
+        yield weather, geometry, angles, start_tilt
+
+def energy_chunks(chunks, tracker, albedo, carry, cap, save_data=True):
+    '''
+    Vectorized energy for every chunk. Motion energy starts from the chunk's
+    start angle (set by tracker_decisions). Yields one recorded DataFrame per chunk, ac is
+    the energy of each step (Wh, power times step length) net of motion energy.
+    '''
+    for weather, geometry, angles, start_tilt in chunks:
+        hours = step_hours(weather.index, carry)
+        with get_profiler().stage('calculate_energy'):
+            _, ac, rad, pvtemps = calculate_energy(pd.Series(angles, index=weather.index), tracker.get_azimuth(), albedo, weather['Wspd'], weather['DryBulb'], weather.index, geometry,
+                                                   weather['DHI'], weather['DNI'], weather['GHI'], tracker.name, save_data=save_data)
+
+        with get_profiler().stage('bookkeeping'):
+            old_tilts = np.concatenate(([start_tilt], angles[:-1]))
+            energy_consumed_move = energy_motion(old_tilts, angles, cap)
+
+            recorder = ResultRecorder(weather.index, save_data=save_data)
+            recorder.record(slice(None), angle=angles, move_energy=energy_consumed_move,
+                            ac=np.asarray(ac, dtype=float)*hours - energy_consumed_move*1000, #kwh to wh
+                            temp_cell=np.asarray(pvtemps['temp_cell'], dtype=float), temp_module=np.asarray(pvtemps['temp_module'], dtype=float))
+            recorder.record_radiation(slice(None), rad)
+
+            chunk = recorder.frame()
+            chunk['p cumulative'] = carry.total + np.nancumsum(chunk['ac'].values)
+
+            carry.total = float(chunk['p cumulative'].values[-1])
+            carry.steps += len(chunk)
+        yield chunk
+
+class ChunkWriter:
+    '''
+    Appends result chunks to a CSV as they arrive.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode='a', header=self.rows == 0)
+        self.rows += len(chunk)
+
+def run_streaming(chunks, tracker, sand_point, albedo, output_path, save_data=True):
+    '''
+    Runs tracker over weather chunks (see weather_chunks/tmy_chunks/csv_chunks),
+    writing per-step results to output_path incrementally.
+
+    Returns the carry, whose total is the energy produced over the whole horizon.
+    '''
+    cap = module_capacity(get_module())
+    carry = Carry()
+    get_profiler().set_label(tracker.name)
+
+    stream = with_geometry(chunks, sand_point)
+    stream = tracker_decisions(stream, tracker, albedo, carry, cap)
+    stream = energy_chunks(stream, tracker, albedo, carry, cap, save_data=save_data)
+
+    writer = ChunkWriter(output_path)
+    for chunk in stream:
+        writer.write(chunk)
+    return carry
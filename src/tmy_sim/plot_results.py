@@ -0,0 +1,66 @@
+#offline plots from the results store, kept off the simulation path
+import argparse
+import json
+import os
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from results_store import read_series, tracker_keys, partition_path, SCALARS_FILE
+
+def _tracker_name(root, station, albedo, key):
+    with open(os.path.join(partition_path(root, station, albedo, key), SCALARS_FILE), 'r') as f:
+        return json.load(f)['tracker']
+
+def plot_run(root, station, albedo, output_loc, figsize=(16, 10)):
+    '''
+    Results and radiation breakdown of every tracker stored for station and albedo
+    '''
+    series = {_tracker_name(root, station, albedo, key): read_series(root, station, albedo, key) for key in tracker_keys(root, station, albedo)}
+
+    fig, ((ax, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=figsize)
+
+    for name, res in series.items():
+        res['p_cumulative'].plot(ax=ax, label=name)
+        res['angle'].plot(ax=ax2, label=name)
+        res['temp_cell'].plot(ax=ax3, label=name)
+        res['move_energy'].plot(ax=ax4, label=name)
+
+    ax.set_ylabel("Cumulative Energy (Wh)")
+    ax2.set_ylabel("angle (deg)")
+    ax3.set_ylabel("cell temp (Deg C)")
+    ax4.set_ylabel("energy consumed (kwh)")
+    ax.legend()
+    plt.savefig("{}/{}_{}_tmy_results.png".format(output_loc, station, albedo))
+    plt.close()
+
+    #radiation breakdown is only stored for runs with save_data
+    if not all('poa_direct' in res for res in series.values()):
+        return
+
+    f, ((ax5, ax6), (ax7, ax8)) = plt.subplots(2, 2, figsize=figsize)
+
+    for name, res in series.items():
+        res['dni_extra'].plot(ax=ax5, label=name)
+        res['sky_diffuse'].plot(ax=ax6, label=name)
+        res['ground_diffuse'].plot(ax=ax7, label=name)
+        res['poa_direct'].plot(ax=ax8, label=name)
+
+    ax5.set_ylabel("Irradiance (W)")
+    ax6.set_ylabel("Irradiance (W)")
+    ax7.set_ylabel("Irradiance (W)")
+    ax8.set_ylabel("Irradiance (W)")
+    ax5.legend()
+    plt.savefig("{}/{}_{}_tmy_rad_breakdown.png".format(output_loc, station, albedo))
+    plt.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot stored runs of one station.")
+    parser.add_argument("store")
+    parser.add_argument("station")
+    parser.add_argument("albedo", type=float)
+    parser.add_argument("output", nargs="?", default=".")
+    return parser.parse_args()
+
+if __name__=="__main__":
+    args = parse_args()
+    plot_run(args.store, args.station, args.albedo, args.output)
@@ -0,0 +1,87 @@
+#per-step result recording with preallocated columns
+import numpy as np
+import pandas as pd
+
+BASE_COLUMNS = ('angle', 'ac', 'move_energy', 'temp_cell', 'temp_module')
+#only recorded with save_data, same order as calculate_energy's rad_timestep
+RADIATION_COLUMNS = ('dni_extra', 'sky_diffuse', 'ground_diffuse', 'poa_direct')
+RADIATION_LABELS = ('dni extra', 'sky diffuse', 'ground diffuse', 'poa direct')
+
+def package_results(tracker, index, angles, energy_consumed_move, ac_all, temps, radiation):
+    '''
+    Labels the raw per-step arrays the same way for the stepwise and batch paths.
+    '''
+    #convert angles to df
+    angles_series = pd.Series(angles, index=index)
+    energy_consumed = pd.Series(energy_consumed_move, index=index)
+
+    #rename
+    temps = temps.rename(columns={'temp_cell': 'cell temp {}'.format(tracker.name)})
+
+    angles_df = pd.DataFrame(angles_series, columns=['angle {}'.format(tracker.name)])
+    energy_consumed_df = pd.DataFrame(energy_consumed, columns=['energy consumed {}'.format(tracker.name)])
+
+    ac_total = pd.Series(ac_all, index=index)
+    sum = ac_total.sum()
+
+    ac_df = pd.DataFrame(ac_total, columns=['ac_step'])
+    ac_df['p cumulative {}'.format(tracker.name)] = ac_df.cumsum()
+
+    return ac_df, angles_df, temps, energy_consumed_df, radiation, sum
+
+class ResultRecorder:
+    '''
+    Typed NumPy columns for every per-step output, allocated once for n steps.
+    Labelled DataFrames are only built at the end by results().
+
+    save_data matches the calculate_energy flag: without it the radiation
+    breakdown columns are neither allocated nor returned.
+    '''
+    def __init__(self, index, save_data=True, dtype=np.float64):
+        self.index = index
+        self.save_data = save_data
+        self.columns = BASE_COLUMNS + (RADIATION_COLUMNS if save_data else ())
+        self.data = {name: np.full(len(index), np.nan, dtype=dtype) for name in self.columns}
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def record(self, i, **values):
+        '''
+        Stores values at step i (an int, or a slice to fill many steps at once).
+        Unrecorded columns are ignored.
+        '''
+        for name, value in values.items():
+            if name in self.data:
+                self.data[name][i] = value
+
+    def record_radiation(self, i, rad_timestep):
+        '''
+        Stores the radiation breakdown returned by calculate_energy, if recorded.
+        '''
+        if self.save_data and rad_timestep is not None:
+            if not isinstance(i, slice):
+                i = slice(i, i + 1)
+            values = np.asarray(rad_timestep, dtype=float).reshape(-1, len(RADIATION_COLUMNS))
+            for j, name in enumerate(RADIATION_COLUMNS):
+                self.data[name][i] = values[:, j]
+
+    def results(self, tracker):
+        '''
+        Same tuple as tmy.run_sim_on_tracker.
+        '''
+        temps = pd.DataFrame({'temp_cell': self.data['temp_cell'], 'temp_module': self.data['temp_module']},
+                             index=self.index, columns=['temp_cell', 'temp_module'])
+
+        radiation = None
+        if self.save_data:
+            radiation = pd.DataFrame({"{} {}".format(label, tracker.name): self.data[name] for label, name in zip(RADIATION_LABELS, RADIATION_COLUMNS)},
+                                     index=self.index, columns=["{} {}".format(label, tracker.name) for label in RADIATION_LABELS])
+
+        return package_results(tracker, self.index, self.data['angle'], self.data['move_energy'], self.data['ac'], temps, radiation)
+
+    def frame(self):
+        '''
+        All recorded columns as one unlabelled DataFrame, for incremental writers.
+        '''
+        return pd.DataFrame(self.data, index=self.index, columns=list(self.columns))
@@ -0,0 +1,152 @@
+#content-addressed cache of run_sim_on_tracker results: the key hashes everything
+#a run depends on (TMY file, albedo, steps, tracker class/code/parameters,
+#module/inverter, model version), so changed cells are recomputed and the rest reused
+import os
+import json
+import pickle
+import hashlib
+import inspect
+import numpy as np
+from tmy_io import file_hash
+from components import DEFAULT_MODULE, DEFAULT_INVERTER
+
+#bump when energy_calcs or the simulation loop change results
+MODEL_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".result_cache")
+#tracker attributes that are state, or only affect speed, not results
+SKIP_ATTRIBUTES = ('agent', 'rng', 'prev_reward', 'chunk_size')
+#puts between two eviction scans of the cache folder
+EVICT_EVERY = 100
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()
+    if isinstance(value, np.generic):
+        return value.item()
+    return repr(value)
+
+def tracker_fingerprint(tracker):
+    '''
+    Class, source and constructor parameters of a tracker.
+    '''
+    cls = type(tracker)
+    try:
+        source = hashlib.sha1(inspect.getsource(cls).encode()).hexdigest()
+    except (OSError, TypeError):
+        source = None
+    params = {k: v for k, v in vars(tracker).items() if k not in SKIP_ATTRIBUTES and not k.startswith('_')}
+    return {'class': cls.__name__, 'source': source, 'params': json.loads(json.dumps(params, sort_keys=True, default=_json_default))}
+
+def cacheable(tracker):
+    '''
+    Only deterministic trackers without learned state are reused (see the
+    cacheable class attribute), runs drawing from an rng are not.
+    '''
+    return getattr(tracker, 'cacheable', False)
+
+class ResultCache:
+    '''
+    Pickled result tuples under cache_dir, one file per key. Hits refresh the
+    file's mtime; once the cache grows past max_bytes the least recently used
+    files are deleted (checked every EVICT_EVERY puts and by evict()). Writes
+    are atomic, so Pool workers can share a cache_dir.
+    '''
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=2*1024**3, module=DEFAULT_MODULE, inverter=DEFAULT_INVERTER):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.module = module
+        self.inverter = inverter
+        self._tmy_hashes = {}
+        self._puts = 0
+
+    def key(self, loc, albedo, steps, tracker):
+        if loc not in self._tmy_hashes:
+            self._tmy_hashes[loc] = file_hash(loc)
+        content = {'tmy': self._tmy_hashes[loc], 'albedo': float(albedo), 'steps': steps, 'tracker': tracker_fingerprint(tracker),
+                   'module': self.module, 'inverter': self.inverter, 'model_version': MODEL_VERSION}
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[0:2], "{}.pkl".format(key))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #write then rename so parallel workers never see a partial file
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        self._puts += 1
+        if self._puts % EVICT_EVERY == 1:
+            self.evict()
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for folder in os.listdir(self.cache_dir):
+            folder = os.path.join(self.cache_dir, folder)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith(".pkl"):
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        '''
+        Deletes least recently used entries until the cache fits in max_bytes.
+        '''
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+def cached_run(cache, loc, tracker, albedos, steps, run):
+    '''
+    Results for every albedo in albedos, from cache where possible. run(pending)
+    computes the missing albedos and returns a dict albedo -> result tuple.
+    '''
+    if cache is None or not cacheable(tracker):
+        return run(list(albedos))
+
+    keys = {albedo: cache.key(loc, albedo, steps, tracker) for albedo in albedos}
+    results = {}
+    for albedo, key in keys.items():
+        result = cache.get(key)
+        if result is not None:
+            results[albedo] = result
+    pending = [albedo for albedo in albedos if albedo not in results]
+    if pending:
+        computed = run(pending)
+        for albedo in pending:
+            cache.put(keys[albedo], computed[albedo])
+        results.update(computed)
+    return results
@@ -0,0 +1,104 @@
+#partitioned results dataset: one folder per station / albedo / tracker holding
+#the per-step series and a json of scalars, laid out hive style
+#(station=.../albedo=.../tracker=...) so sweeps can be queried without parsing text
+import os
+import json
+from glob import glob
+import numpy as np
+import pandas as pd
+from recorder import RADIATION_COLUMNS
+
+SERIES_COLUMNS = ('ac', 'p_cumulative', 'angle', 'temp_cell', 'temp_module', 'move_energy') + RADIATION_COLUMNS
+SCALARS_FILE = "scalars.json"
+SCALAR_COLUMNS = ('station', 'tmy_loc_name', 'albedo', 'steps', 'tracker_key', 'tracker', 'energy', 'move_energy')
+
+def _parquet_available():
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            pass
+    return False
+
+#parquet when an engine is installed, CSV otherwise; readers go by the extension
+SERIES_FORMAT = "parquet" if _parquet_available() else "csv"
+
+def partition_path(root, station, albedo, tracker_key):
+    return os.path.join(root, "station={}".format(station), "albedo={:g}".format(albedo), "tracker={}".format(tracker_key))
+
+def _replace_into(path, write):
+    #write then rename so parallel workers and readers never see a partial file
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def series_frame(result):
+    '''
+    Per-step columns (SERIES_COLUMNS) from a run_sim_on_tracker result tuple,
+    without the tracker name in the labels.
+    '''
+    ac_df, angles_df, temps, energy_consumed_df, radiation, _ = result
+    series = pd.DataFrame({'ac': ac_df.iloc[:, 0].values, 'p_cumulative': ac_df.iloc[:, 1].values,
+                           'angle': angles_df.iloc[:, 0].values,
+                           'temp_cell': temps.iloc[:, 0].values, 'temp_module': temps.iloc[:, 1].values,
+                           'move_energy': energy_consumed_df.iloc[:, 0].values}, index=ac_df.index)
+    if radiation is not None:
+        for j, name in enumerate(RADIATION_COLUMNS):
+            series[name] = radiation.iloc[:, j].values
+    series.index.name = 'time'
+    return series
+
+def write_run(root, station, albedo, tracker_key, tracker_name, result, steps, tmy_loc_name="", timings=None):
+    '''
+    Stores one station x albedo x tracker run. The scalars are written last, so a
+    partition with scalars.json is complete. Safe to call from Pool workers.
+    '''
+    path = partition_path(root, station, albedo, tracker_key)
+    os.makedirs(path, exist_ok=True)
+
+    series = series_frame(result)
+    series_path = os.path.join(path, "series.{}".format(SERIES_FORMAT))
+    if SERIES_FORMAT == "parquet":
+        _replace_into(series_path, lambda p: series.to_parquet(p))
+    else:
+        _replace_into(series_path, lambda p: series.to_csv(p))
+
+    scalars = {'station': station, 'tmy_loc_name': tmy_loc_name, 'albedo': float(albedo), 'steps': int(steps),
+               'tracker_key': tracker_key, 'tracker': tracker_name, 'energy': float(result[5]),
+               'move_energy': float(np.nansum(series['move_energy'].values)), 'timings': timings or []}
+
+    def write_scalars(p):
+        with open(p, 'w') as f:
+            json.dump(scalars, f)
+    _replace_into(os.path.join(path, SCALARS_FILE), write_scalars)
+    return path
+
+def has_run(root, station, albedo, tracker_key):
+    return os.path.exists(os.path.join(partition_path(root, station, albedo, tracker_key), SCALARS_FILE))
+
+def read_scalars(root):
+    '''
+    All complete partitions as a tidy DataFrame, one row per station x albedo x tracker.
+    '''
+    rows = []
+    for path in sorted(glob(os.path.join(root, "station=*", "albedo=*", "tracker=*", SCALARS_FILE))):
+        with open(path, 'r') as f:
+            scalars = json.load(f)
+        scalars.pop('timings', None)
+        rows.append(scalars)
+    return pd.DataFrame(rows, columns=list(SCALAR_COLUMNS))
+
+def read_series(root, station, albedo, tracker_key):
+    path = partition_path(root, station, albedo, tracker_key)
+    parquet_path = os.path.join(path, "series.parquet")
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return pd.read_csv(os.path.join(path, "series.csv"), index_col=0, parse_dates=True)
+
+def tracker_keys(root, station, albedo):
+    '''
+    Trackers with a complete run for station and albedo.
+    '''
+    pattern = os.path.join(partition_path(root, station, albedo, "*"), SCALARS_FILE)
+    return sorted(os.path.basename(os.path.dirname(path)).split("=", 1)[1] for path in glob(pattern))
@@ -1,34 +1,207 @@
 #runs simulation on all TMY files in a folder
-from tmy import run
-from os import listdir
+from tmy import load_station, run_sim_on_tracker, write_summary, DEFAULT_TRACKERS
+from trackers import make_tracker
+from components import preload
+from shared_data import SharedStations, install_shared, release_shared
+from result_cache import ResultCache, cached_run
+from results_store import write_run
+from instrumentation import Profiler, get_profiler, set_profiler, enable_worker_cprofile, dump_worker_cprofile
+from os import listdir, makedirs, cpu_count, replace, getpid
+from os.path import exists, join
+import argparse
+import json
+import threading
 import numpy as np
 from tqdm import tqdm
 from multiprocessing import Pool
 
-def run_parallel(args):
-    # print("spawning processs")
-    run(*args)
-    # print("finished")
+#completion markers live here, inside output_loc
+DONE_FOLDER = ".done"
+#per worker pstats dumps, inside output_loc
+PROFILE_FOLDER = "profiles"
 
+def marker_path(output_loc, name, albedo, tracker_key, steps):
+    #keyed by the requested steps ('max' or a count), a cell run with other steps is not done
+    return join(output_loc, DONE_FOLDER, "{}_{:g}_{}_{}.json".format(name, albedo, tracker_key, steps))
 
-def run_folder(folder, output_loc, steps, albedo_range = (0.2, 0.5), albedo_step=0.3):
+def write_marker(path, tracker_name, total):
+    #write then rename so an interrupted task never leaves a marker behind
+    tmp_path = "{}.{}.tmp".format(path, getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump({'tracker': tracker_name, 'sum': float(total)}, f)
+    replace(tmp_path, path)
+
+def read_marker(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def run_station(args):
     '''
-    Run all TMY files in folder
+    Runs every pending (albedo, tracker) cell of one station. The TMY data and
+    solar geometry are loaded once and shared by all cells, and each tracker
+    evaluates all of its pending albedos in a single pass.
+
+    With profile, stage timings go into the summaries and the worker's
+    cProfile stats are dumped to output_loc/profiles. With store, every cell's
+    series and scalars are written to that results_store root as well. With
+    cache, cells whose result is in the result_cache are not recomputed. Without
+    resume, cells are rerun even if they have a completion marker. shared is the
+    station's shared_data descriptor if the parent published it, it is attached
+    for this task only.
+    '''
+    loc, name, cells, output_loc, steps, profile, store, cache, resume, shared = args
+    if shared is not None:
+        install_shared({loc: shared})
+    if profile:
+        enable_worker_cprofile()
+        profiler = Profiler()
+        set_profiler(profiler)
+    try:
+        _run_station_cells(loc, name, cells, output_loc, steps, store, cache, resume)
+    finally:
+        if shared is not None:
+            release_shared(loc)
+        if profile:
+            set_profiler(None)
+            dump_worker_cprofile(join(output_loc, PROFILE_FOLDER))
+    return loc
+
+def _run_station_cells(loc, name, cells, output_loc, steps, store=None, cache=None, resume=True):
+    tmy_data, meta, sand_point, geometry = load_station(loc)
+    marker = lambda albedo, tracker_key: marker_path(output_loc, name, albedo, tracker_key, steps)
+    if steps == "max":
+        steps = len(tmy_data.index)
+
+    albedos = sorted(set(albedo for albedo, _ in cells))
+    tracker_keys = list(dict.fromkeys(key for _, key in cells))
+    for tracker_key in tracker_keys:
+        #finished cells come from an earlier, interrupted sweep. With a cache every
+        #cell is looked up instead, so cells invalidated by a change are rerun
+        pending = [albedo for albedo in albedos if (albedo, tracker_key) in cells and (not resume or cache is not None or not exists(marker(albedo, tracker_key)))]
+        if len(pending) == 0:
+            continue
+        tracker = make_tracker(tracker_key)
+        results = cached_run(cache, loc, tracker, pending, steps,
+                             lambda albedos: run_sim_on_tracker(tracker, tmy_data, sand_point, albedos, n_epochs=1, n_steps=steps, geometry=geometry))
+        for albedo in pending:
+            if store is not None:
+                write_run(store, name, albedo, tracker_key, tracker.name, results[albedo], steps, tmy_loc_name=meta['Name'],
+                          timings=get_profiler().summary_lines())
+            write_marker(marker(albedo, tracker_key), tracker.name, results[albedo][5])
+
+    for albedo in albedos:
+        sums = {}
+        for cell_albedo, tracker_key in cells:
+            if cell_albedo == albedo:
+                done = read_marker(marker(albedo, tracker_key))
+                sums[done['tracker']] = done['sum']
+        write_summary(sums, albedo, output_loc, name, steps, meta['Name'], timings=get_profiler().summary_lines())
+
+def build_tasks(folder, output_loc, steps, albedos, trackers, limit=None, resume=True, profile=False, store=None, cache=None):
     '''
+    One task per station holding its pending station x albedo x tracker cells.
+    With resume, stations whose cells all have completion markers are skipped,
+    unless a result cache decides what is up to date.
+    '''
+    #skip the cache folder and anything else that is not a TMY3 CSV
+    tmy_files = [tmy for tmy in sorted(listdir(folder)) if tmy.lower().endswith(".csv")]
+    if limit is not None:
+        tmy_files = tmy_files[0:limit]
 
-    args = []
-    for tmy in tqdm(listdir(folder)[0:10]):
+    tasks = []
+    for tmy in tmy_files:
         loc = "{}/{}".format(folder, tmy)
         name = tmy.split(".")[0]
-        for albedo in np.arange(albedo_range[0], albedo_range[1], albedo_step):
-            args.append((loc, albedo, output_loc, name, steps))
+        cells = [(albedo, key) for albedo in albedos for key in trackers]
+        if resume and cache is None and all(exists(marker_path(output_loc, name, albedo, key, steps)) for albedo, key in cells):
+            continue
+        tasks.append((loc, name, cells, output_loc, steps, profile, store, cache, resume, None))
+    return tasks
+
+def _published_tasks(tasks, stations, slots):
+    '''
+    Yields the tasks with their station published in shared memory. Pulled by
+    the Pool's task feeder, so stations are loaded while workers simulate; slots
+    bounds how many are published at once (released as tasks finish).
+    '''
+    for task in tasks:
+        slots.acquire()
+        tmy_data, meta, _, geometry = load_station(task[0])
+        yield task[:-1] + (stations.add(task[0], tmy_data, meta, geometry),)
+
+def run_folder(folder, output_loc, steps, albedo_range = (0.2, 0.5), albedo_step=0.3, trackers=None, workers=None, chunksize=1, limit=None, resume=True, profile=False, store=None, shared=False, cache=None, shared_window=None):
+    '''
+    Run all TMY files in folder
+
+    workers defaults to the number of cores. Interrupted sweeps resume from the
+    per-cell completion markers unless resume is False.
+
+    With shared, the parent loads each pending station once into shared memory
+    and the worker running it attaches to it. At most shared_window stations
+    (default two per worker) are published at a time, each is freed as soon as
+    its task is done. cache is a result_cache.ResultCache shared by all workers.
+    '''
+    if trackers is None:
+        trackers = DEFAULT_TRACKERS
+    if workers is None:
+        workers = cpu_count()
+    makedirs(join(output_loc, DONE_FOLDER), exist_ok=True)
+
+    albedos = [float(albedo) for albedo in np.arange(albedo_range[0], albedo_range[1], albedo_step)]
+    tasks = build_tasks(folder, output_loc, steps, albedos, trackers, limit=limit, resume=resume, profile=profile, store=store, cache=cache)
+
+    #parsed once here, forked/handed to the workers instead of re-parsed per task
+    records = preload()
+
+    total = len(tasks)
+    with SharedStations() as stations:
+        slots = None
+        if shared:
+            #a feeder chunk must fit, or it would wait for slots nothing releases
+            window = max(shared_window or 2*workers*chunksize, chunksize)
+            slots = threading.Semaphore(window)
+            tasks = _published_tasks(tasks, stations, slots)
+
+        with Pool(workers, initializer=install_shared, initargs=({}, records)) as p:
+            try:
+                for loc in tqdm(p.imap_unordered(run_station, tasks, chunksize=chunksize), total=total):
+                    if slots is not None:
+                        stations.remove(loc)
+                        slots.release()
+            except BaseException:
+                #unblock the feeder so terminate() can join it
+                if slots is not None:
+                    for _ in range(window):
+                        slots.release()
+                raise
+
+    if cache is not None:
+        cache.evict()
 
-    with Pool(4) as p:
-        for _ in tqdm(p.imap_unordered(run_parallel, args), total=len(args)):
-            pass
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the tracker simulation on every TMY3 file in a folder.")
+    parser.add_argument("folder", nargs="?", default="../../data/alltmy3a")
+    parser.add_argument("output", nargs="?", default="../../plots/all_tmy")
+    parser.add_argument("--steps", default="max", help="steps per station, or 'max'")
+    parser.add_argument("--workers", type=int, default=None, help="pool size, defaults to the number of cores")
+    parser.add_argument("--chunksize", type=int, default=1, help="stations handed to a worker at a time")
+    parser.add_argument("--albedo-range", type=float, nargs=2, default=(0.2, 0.5))
+    parser.add_argument("--albedo-step", type=float, default=0.3)
+    parser.add_argument("--trackers", nargs="+", default=DEFAULT_TRACKERS)
+    parser.add_argument("--limit", type=int, default=None, help="only run the first LIMIT stations")
+    parser.add_argument("--no-resume", action="store_true", help="ignore completion markers and rerun everything")
+    parser.add_argument("--profile", action="store_true", help="write stage timings to the summaries and pstats per worker")
+    parser.add_argument("--shared", action="store_true", help="load stations once in the parent and share them with the workers")
+    parser.add_argument("--cache", default=None, help="result cache folder, unchanged cells are reused from it")
+    parser.add_argument("--cache-max-gb", type=float, default=2., help="result cache size before least recently used entries are evicted")
+    parser.add_argument("--store", default=None, help="also write per-step results to this partitioned results store")
+    args = parser.parse_args()
+    if args.steps != "max":
+        args.steps = int(args.steps)
+    return args
 
 if __name__=="__main__":
-    # folder = "../../data/alltmy3a"
-    folder = "../../data/alltmy3a"
-    steps = 'max'
-    run_folder(folder, "../../plots/all_tmy", steps)
+    args = parse_args()
+    run_folder(args.folder, args.output, args.steps, albedo_range=args.albedo_range, albedo_step=args.albedo_step,
+               trackers=args.trackers, workers=args.workers, chunksize=args.chunksize, limit=args.limit, resume=not args.no_resume, profile=args.profile, store=args.store, shared=args.shared,
+               cache=ResultCache(args.cache, max_bytes=int(args.cache_max_gb*1024**3)) if args.cache else None)
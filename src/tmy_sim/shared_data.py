@@ -0,0 +1,118 @@
+#station arrays in multiprocessing.shared_memory: the parent publishes each
+#station's weather, index and solar geometry once, Pool workers attach
+#zero-copy NumPy views (see tmy.load_station) instead of re-reading files
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pytz
+from components import install_records
+
+#loc -> descriptors, set in workers by install_shared
+_published = {}
+#attached SharedMemory blocks, kept until release_shared drops their station
+_attached = {}
+
+def _share(values, blocks):
+    values = np.ascontiguousarray(values)
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[...] = values
+    blocks.append(shm)
+    return (shm.name, values.shape, values.dtype.str)
+
+def _attach(descriptor):
+    name, shape, dtype = descriptor
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_attached[name].buf)
+    view.flags.writeable = False
+    return view
+
+class SharedStations:
+    '''
+    Parent side. add() copies a loaded station into shared memory, descriptors()
+    is handed to the workers (Pool initializer install_shared, or per task).
+    remove() frees one station once its tasks are done, close() frees the rest,
+    use it as a context manager around the Pool. add/remove may be called from
+    different threads.
+    '''
+    def __init__(self):
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self.stations = {}
+
+    def add(self, loc, tmy_data, meta, geometry):
+        blocks = []
+        station = {
+            'values': _share(tmy_data.values.astype(float), blocks),
+            'columns': list(tmy_data.columns),
+            'index': _share(np.asarray(tmy_data.index.view('int64')), blocks),
+            'tz_offset_minutes': int(tmy_data.index[0].utcoffset().total_seconds() // 60),
+            'geometry': _share(geometry.values.astype(float), blocks),
+            'geometry_columns': list(geometry.columns),
+            'meta': meta,
+        }
+        with self._lock:
+            self._blocks[loc] = blocks
+            self.stations[loc] = station
+        return station
+
+    def descriptors(self):
+        with self._lock:
+            return dict(self.stations)
+
+    def remove(self, loc):
+        with self._lock:
+            blocks = self._blocks.pop(loc, [])
+            self.stations.pop(loc, None)
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        for loc in list(self._blocks):
+            self.remove(loc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def install_shared(stations, records=None):
+    '''
+    Pool initializer: registers the published stations (and component records,
+    see components.install_records) in the worker.
+    '''
+    _published.update(stations)
+    if records is not None:
+        install_records(records)
+
+def release_shared(loc):
+    '''
+    Worker side: forgets a published station and closes its blocks. Blocks still
+    viewed by live arrays stay mapped until those are gone.
+    '''
+    station = _published.pop(loc, None)
+    if station is None:
+        return
+    for key in ('values', 'index', 'geometry'):
+        shm = _attached.pop(station[key][0], None)
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+def attached_station(loc):
+    '''
+    (tmy_data, meta, geometry) as views of the published arrays, None if loc was not published.
+    '''
+    station = _published.get(loc)
+    if station is None:
+        return None
+    index = pd.DatetimeIndex(_attach(station['index']), tz='UTC').tz_convert(pytz.FixedOffset(station['tz_offset_minutes']))
+    tmy_data = pd.DataFrame(_attach(station['values']), index=index, columns=station['columns'], copy=False)
+    geometry = pd.DataFrame(_attach(station['geometry']), index=index, columns=station['geometry_columns'], copy=False)
+    return tmy_data, station['meta'], geometry
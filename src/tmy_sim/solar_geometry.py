@@ -0,0 +1,87 @@
+#solar geometry cache: solar position and single-axis angles only depend on the
+#station and the timestamps, so they are computed once and shared by every
+#tracker, albedo and run
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pvlib
+
+GEOMETRY_COLUMNS = ['apparent_zenith', 'zenith', 'azimuth', 'tracker_theta']
+#bump when compute_solar_geometry changes, older cache files are then ignored
+GEOMETRY_VERSION = 2
+
+#stations kept in memory per process, a folder sweep touches each one once
+GEOMETRY_CACHE_SIZE = 4
+
+#in-process LRU cache, key -> DataFrame
+_geometry_cache = OrderedDict()
+
+def geometry_key(index, latitude, longitude, altitude):
+    '''
+    Key for a station (lat/lon/alt) and a time index.
+    '''
+    index_hash = hashlib.sha1(np.asarray(index.view('int64')).tobytes()).hexdigest()[0:16]
+    return "v{}_{:.4f}_{:.4f}_{:.1f}_{}".format(GEOMETRY_VERSION, latitude, longitude, altitude or 0, index_hash)
+
+def compute_solar_geometry(index, latitude, longitude, altitude=None):
+    '''
+    Solar position (SPA) and true-tracking single-axis angles for every timestamp.
+
+    altitude only keys the cache: SPA runs at the get_solarposition defaults
+    (sea level, standard pressure) like the original per-step call, so cached
+    and uncached results are the same.
+    '''
+    solpos = pvlib.solarposition.get_solarposition(index, latitude, longitude)
+    angle_pos = pvlib.tracking.singleaxis(solpos['apparent_zenith'], solpos['azimuth'], backtrack=False)
+
+    geometry = pd.DataFrame(index=index)
+    for col in ['apparent_zenith', 'zenith', 'azimuth']:
+        geometry[col] = np.asarray(solpos[col], dtype=float)
+    geometry['tracker_theta'] = np.asarray(angle_pos['tracker_theta'], dtype=float)
+    return geometry
+
+def _save(path, values):
+    #write then rename so parallel workers never see a partial file
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+def get_solar_geometry(index, latitude, longitude, altitude=None, cache_dir=None, mmap_mode=None):
+    '''
+    Returns solar geometry for index, computing it at most once per station.
+
+    The last GEOMETRY_CACHE_SIZE results are kept in memory and, if cache_dir is given (usually the folder of
+    the TMY file), persisted there as .npy so later runs skip SPA entirely.
+    With mmap_mode ('r'), cached values are memory-mapped, so processes on the
+    same station share the pages instead of holding copies.
+    '''
+    key = geometry_key(index, latitude, longitude, altitude)
+    if key in _geometry_cache:
+        _geometry_cache.move_to_end(key)
+        return _geometry_cache[key]
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, "solgeom_{}.npy".format(key))
+
+    geometry = None
+    if path is not None and os.path.exists(path):
+        values = np.load(path, mmap_mode=mmap_mode)
+        if values.shape == (len(index), len(GEOMETRY_COLUMNS)):
+            geometry = pd.DataFrame(values, index=index, columns=GEOMETRY_COLUMNS)
+
+    if geometry is None:
+        geometry = compute_solar_geometry(index, latitude, longitude, altitude)
+        if path is not None:
+            _save(path, geometry[GEOMETRY_COLUMNS].values)
+
+    _geometry_cache[key] = geometry
+    while len(_geometry_cache) > GEOMETRY_CACHE_SIZE:
+        _geometry_cache.popitem(last=False)
+    return geometry
+
+def clear_geometry_cache():
+    _geometry_cache.clear()
@@ -0,0 +1,104 @@
+#compact array-backed tracker state
+import numpy as np
+from simple_rl.mdp.oomdp.OOMDPObjectClass import OOMDPObject
+from simple_rl.mdp.oomdp.OOMDPStateClass import OOMDPState
+
+#fixed feature layout, (object class, attributes) in order
+STATE_LAYOUT = (('sun', ('apparent_zenith', 'azimuth')),
+                ('env', ('DHI', 'GHI', 'DNI', 'Wspd', 'DryBulb', 'TotCld', 'OpqCld', 'albedo', 'hour')),
+                ('tracker', ('tracker_theta', 'prev_angle')))
+
+FEATURES = tuple(attr for _, attrs in STATE_LAYOUT for attr in attrs)
+FEATURE_INDEX = {attr: i for i, attr in enumerate(FEATURES)}
+NUM_FEATURES = len(FEATURES)
+PREV_ANGLE = FEATURE_INDEX['prev_angle']
+#typical magnitude of each feature (deg, W/m^2, m/s, C, tenths, -, h), for learners that need features near 1
+FEATURE_SCALES = np.array([90., 360., 1000., 1000., 1000., 10., 40., 10., 10., 1., 24., 90., 90.])
+
+class StateObject:
+    '''
+    Read-only view of one object class of a TrackerState, indexed like an OOMDPObject.
+    '''
+    __slots__ = ('state', 'class_name')
+
+    def __init__(self, state, class_name):
+        self.state = state
+        self.class_name = class_name
+
+    def __getitem__(self, attr):
+        if attr == 'datetime':
+            return self.state.datetime
+        return self.state.data[FEATURE_INDEX[attr]]
+
+class TrackerState:
+    '''
+    State as a flat float vector with the FEATURES layout.
+
+    features() hands the vector straight to the simple_rl agents (LinUCB with
+    context_size=NUM_FEATURES, LinearSarsa), trackers read attributes with
+    state['name'], and get_objects_of_class/to_oomdp keep the OOMDP interface.
+    datetime (ns since epoch, 1 element array) is kept outside the features.
+    '''
+    __slots__ = ('data', 'datetime', '_is_terminal')
+
+    def __init__(self, data, datetime=None, is_terminal=False):
+        self.data = data
+        self.datetime = datetime
+        self._is_terminal = is_terminal
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key == 'datetime':
+                return self.datetime
+            return self.data[FEATURE_INDEX[key]]
+        return self.data[key]
+
+    def __len__(self):
+        return NUM_FEATURES
+
+    def __hash__(self):
+        return hash(self.data.tobytes())
+
+    def __eq__(self, other):
+        return isinstance(other, TrackerState) and np.array_equal(self.data, other.data)
+
+    def __str__(self):
+        return "s: " + str(self.data)
+
+    def features(self):
+        return self.data
+
+    def get_num_feats(self):
+        return NUM_FEATURES
+
+    def is_terminal(self):
+        return self._is_terminal
+
+    def set_terminal(self, is_term=True):
+        self._is_terminal = is_term
+
+    def get_objects_of_class(self, class_name):
+        return [StateObject(self, class_name)]
+
+    def to_oomdp(self):
+        '''
+        Equivalent OOMDPState for agents that need real OOMDP objects.
+        '''
+        objects = {}
+        for class_name, attrs in STATE_LAYOUT:
+            attributes = {attr: float(self.data[FEATURE_INDEX[attr]]) for attr in attrs}
+            if class_name == 'env':
+                attributes['datetime'] = self.datetime
+            objects[class_name] = [OOMDPObject(attributes, name=class_name)]
+        return OOMDPState(objects)
+
+def features_from_frame(frame):
+    '''
+    (steps x NUM_FEATURES) matrix from a frame built by tmy.tmy_to_frame.
+    Columns missing from the frame (prev_angle) are left at 0.
+    '''
+    features = np.zeros((len(frame), NUM_FEATURES))
+    for attr in FEATURES:
+        if attr in frame:
+            features[:, FEATURE_INDEX[attr]] = np.asarray(frame[attr], dtype=float)
+    return features
@@ -0,0 +1,163 @@
+#multi-station screening: for trackers that need no feedback, the whole model
+#chain is elementwise over time, so many stations are stacked into one long
+#(stations x steps) run and simulated in a few large array passes
+import argparse
+import os
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+import pvlib
+import pvlib.spa
+from tqdm import tqdm
+from tmy_io import read_tmy
+from trackers import make_tracker
+from energy_calcs import calculate_energy_grid, energy_motion
+from components import get_module, get_inverter, module_capacity, preload, install_records
+
+#trackers screened by default, all implement get_angles
+SCREEN_TRACKERS = ['fixed', 'astro', 'optimal']
+WEATHER_COLUMNS = ['DHI', 'GHI', 'DNI', 'Wspd', 'DryBulb', 'TotCld', 'OpqCld']
+#pvlib.solarposition.get_solarposition defaults, the ones solar_geometry runs SPA with
+SPA_ALTITUDE = 0.
+SPA_PRESSURE = 101325.
+SPA_TEMPERATURE = 12
+SPA_DELTA_T = 67.0
+SPA_ATMOS_REFRACT = 0.5667
+
+class StationBatch:
+    '''
+    Weather of several stations stacked station after station. index is local
+    wall-clock time (day of year and hour as in the per-station runs), utc the
+    matching instants for solar position.
+    '''
+    def __init__(self, names, metas, frames):
+        lengths = set(len(frame) for frame in frames)
+        if len(lengths) != 1:
+            raise ValueError("stations must have the same number of steps, got {}".format(sorted(lengths)))
+        self.names = names
+        self.metas = metas
+        self.n_steps = lengths.pop()
+
+        self.index = pd.DatetimeIndex(np.concatenate([frame.index.tz_localize(None).values for frame in frames]))
+        self.utc = np.concatenate([frame.index.view('int64') for frame in frames])
+        self.weather = pd.DataFrame(np.concatenate([frame[WEATHER_COLUMNS].values for frame in frames]).astype(float),
+                                    index=self.index, columns=WEATHER_COLUMNS)
+
+        per_step = lambda key: np.repeat([float(meta[key]) for meta in metas], self.n_steps)
+        self.latitude = per_step('latitude')
+        self.longitude = per_step('longitude')
+        self.altitude = per_step('altitude')
+
+    def __len__(self):
+        return len(self.names)
+
+    def per_station(self, values):
+        '''
+        (..., stations*steps) -> (..., stations, steps)
+        '''
+        values = np.asarray(values)
+        return values.reshape(values.shape[:-1] + (len(self), self.n_steps))
+
+def load_batch(locs):
+    '''
+    Reads (through the binary TMY cache) and stacks the stations in locs.
+    '''
+    names, metas, frames = [], [], []
+    for loc in locs:
+        tmy_data, meta = read_tmy(loc)
+        names.append(os.path.basename(loc).split(".")[0])
+        metas.append(meta)
+        frames.append(tmy_data)
+    return StationBatch(names, metas, frames)
+
+def batch_geometry(batch):
+    '''
+    Solar position and true-tracking angles for every station at once. SPA is
+    elementwise, so it runs on the stacked arrays with per-step lat/lon, at the
+    same altitude and pressure as solar_geometry.compute_solar_geometry.
+    '''
+    #solar_position_numpy takes hPa, like spa_python passes it
+    app_zenith, zenith, _, _, azimuth, _ = pvlib.spa.solar_position_numpy(batch.utc / 1e9, batch.latitude, batch.longitude, SPA_ALTITUDE, SPA_PRESSURE / 100,
+                                                                          SPA_TEMPERATURE, SPA_DELTA_T, SPA_ATMOS_REFRACT, 0)
+    geometry = pd.DataFrame({'apparent_zenith': app_zenith, 'zenith': zenith, 'azimuth': azimuth}, index=batch.index)
+
+    angle_pos = pvlib.tracking.singleaxis(pd.Series(app_zenith), pd.Series(azimuth), backtrack=False)
+    geometry['tracker_theta'] = np.asarray(angle_pos['tracker_theta'], dtype=float)
+    return geometry
+
+def batch_frame(batch, geometry, tracker, albedo):
+    '''
+    Same columns as tmy.tmy_to_frame, over the stacked stations.
+    '''
+    hour = batch.index.hour
+    fallback = np.where(hour > 12, tracker.fallback_angle, -tracker.fallback_angle)
+    tracker_theta = geometry['tracker_theta'].values
+
+    frame = pd.DataFrame({'apparent_zenith': geometry['apparent_zenith'].values, 'azimuth': geometry['azimuth'].values}, index=batch.index)
+    for col in WEATHER_COLUMNS:
+        frame[col] = batch.weather[col].values
+    frame['albedo'] = albedo
+    frame['hour'] = hour
+    frame['tracker_theta'] = np.where(np.isnan(tracker_theta), fallback, tracker_theta)
+    return frame
+
+def simulate_batch(batch, trackers=SCREEN_TRACKERS, albedo=0.2, module=None, inverter=None, geometry=None):
+    '''
+    Annual energy (Wh, motion energy subtracted like run_sim_on_tracker) of every
+    station for every tracker key. Returns a DataFrame, stations x tracker names.
+    '''
+    if module is None:
+        module = get_module()
+    if inverter is None:
+        inverter = get_inverter()
+    if geometry is None:
+        geometry = batch_geometry(batch)
+    cap = module_capacity(module)
+    weather = batch.weather
+
+    energy = {}
+    for key in trackers:
+        tracker = make_tracker(key)
+        frame = batch_frame(batch, geometry, tracker, albedo)
+        angles = batch.per_station(np.asarray(tracker.get_angles(frame), dtype=float))
+
+        ac = calculate_energy_grid(angles.reshape(1, -1), tracker.get_azimuth(), albedo, weather['Wspd'], weather['DryBulb'], batch.index, geometry,
+                                   weather['DHI'], weather['DNI'], weather['GHI'], module=module, inverter=inverter)
+
+        #every station starts flat, like the per-station runs
+        old_tilts = np.concatenate((np.zeros((len(batch), 1)), angles[:, :-1]), axis=1)
+        energy_consumed_move = energy_motion(old_tilts, angles, cap)
+        energy[tracker.name] = np.nansum(batch.per_station(ac[0]) - energy_consumed_move*1000, axis=1) #kwh to wh
+
+    return pd.DataFrame(energy, index=pd.Index(batch.names, name='station'))
+
+def _screen_group(args):
+    locs, trackers, albedo = args
+    return simulate_batch(load_batch(locs), trackers=trackers, albedo=albedo)
+
+def screen_folder(folder, trackers=SCREEN_TRACKERS, albedo=0.2, stations_per_pass=16, workers=None):
+    '''
+    Annual energy of every TMY3 file in folder. Groups of stations_per_pass
+    stations are simulated as one batch, groups are spread over a Pool.
+    '''
+    locs = ["{}/{}".format(folder, tmy) for tmy in sorted(os.listdir(folder)) if tmy.lower().endswith(".csv")]
+    groups = [(locs[start:start + stations_per_pass], trackers, albedo) for start in range(0, len(locs), stations_per_pass)]
+
+    records = preload()
+    with Pool(workers, initializer=install_records, initargs=(records,)) as p:
+        results = list(tqdm(p.imap_unordered(_screen_group, groups), total=len(groups)))
+    return pd.concat(results).sort_index()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Annual energy of every station in a folder, many stations per array pass.")
+    parser.add_argument("folder", nargs="?", default="../../data/alltmy3a")
+    parser.add_argument("output", nargs="?", default="../../plots/screening.csv")
+    parser.add_argument("--albedo", type=float, default=0.2)
+    parser.add_argument("--trackers", nargs="+", default=SCREEN_TRACKERS)
+    parser.add_argument("--stations-per-pass", type=int, default=16, help="stations stacked into one array pass")
+    parser.add_argument("--workers", type=int, default=None, help="pool size, defaults to the number of cores")
+    return parser.parse_args()
+
+if __name__=="__main__":
+    args = parse_args()
+    screen_folder(args.folder, args.trackers, args.albedo, args.stations_per_pass, args.workers).to_csv(args.output)
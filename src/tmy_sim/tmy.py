@@ -2,195 +2,324 @@
 
 import pvlib
 import pandas as pd
-from pvlib.pvsystem import PVSystem, retrieve_sam
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import numpy as np
-import simple_rl as rl
-from simple_rl.mdp.oomdp.OOMDPObjectClass import OOMDPObject
-from simple_rl.mdp.oomdp.OOMDPStateClass import OOMDPState
-from tqdm import trange
-import time
 from trackers import *
-from energy_calcs import calculate_energy, energy_motion
-import os
+from energy_calcs import calculate_energy, energy_arrays, energy_motion
+from field_geometry import field_energy
+from solar_geometry import get_solar_geometry
+from state import TrackerState, features_from_frame, PREV_ANGLE
+from recorder import ResultRecorder, RADIATION_COLUMNS
+from results_store import write_run
+from result_cache import cached_run
+from tmy_io import read_tmy, default_cache_dir
+from shared_data import attached_station
+from components import get_module, module_capacity
+from instrumentation import Profiler, get_profiler, set_profiler
+import copy
 
 def tmy_step_to_OOMDP(current_step_data, tracker, solpos, old_tilt, albedo):
     '''
-    Creates OOMDP state from TMY data.
+    Creates the state for one TMY step. Returns a TrackerState, which keeps the
+    OOMDP interface (get_objects_of_class, to_oomdp) on top of a flat feature vector.
     '''
+    frame = tmy_to_frame(current_step_data, tracker, solpos, albedo)
+    data = features_from_frame(frame)[0]
+    data[PREV_ANGLE] = old_tilt
 
-    #time since epoch in sec
-    last_unix = current_step_data.index.view('int64')
-    #time of day
-    hour = current_step_data.index.hour
+    #time since epoch in ns
+    return TrackerState(data, datetime=np.asarray(current_step_data.index.view('int64')))
 
-    sun_attributes = {'apparent_zenith': float(solpos['apparent_zenith']), 'azimuth': float(solpos['azimuth'])}
-    env_attributes = {'DHI': float(current_step_data['DHI']), 'GHI': float(current_step_data['GHI']), 'DNI':float(current_step_data['DNI']), 'Wspd':float(current_step_data['Wspd']), 'DryBulb': float(current_step_data['DryBulb']), 'TotCld':float(current_step_data['TotCld']), 'OpqCld':float(current_step_data['OpqCld']),
-                        'albedo':albedo,  'datetime':last_unix, 'hour':hour}
+def tmy_to_frame(tmy_data, tracker, solpos, albedo):
+    '''
+    Batch analogue of tmy_step_to_OOMDP: one row per TMY step with the sun, env
+    and tracker attributes as columns (prev_angle is left out, it depends on feedback).
+    '''
+    hour = tmy_data.index.hour
+
+    if 'tracker_theta' in solpos:
+        surface_tilt = np.asarray(solpos['tracker_theta'], dtype=float)
+    else:
+        angle_pos = pvlib.tracking.singleaxis(solpos['apparent_zenith'], solpos['azimuth'], backtrack=False)
+        surface_tilt = np.asarray(angle_pos['tracker_theta'], dtype=float)
+
+    #same nighttime fallback as the stepwise state
+    fallback = np.where(hour > 12, tracker.fallback_angle, -tracker.fallback_angle)
+    surface_tilt = np.where(np.isnan(surface_tilt), fallback, surface_tilt)
+
+    frame = pd.DataFrame({'apparent_zenith': solpos['apparent_zenith'], 'azimuth': solpos['azimuth']}, index=tmy_data.index)
+    for col in ['DHI', 'GHI', 'DNI', 'Wspd', 'DryBulb', 'TotCld', 'OpqCld']:
+        frame[col] = tmy_data[col].astype(float)
+    frame['albedo'] = albedo
+    frame['hour'] = hour
+    frame['tracker_theta'] = surface_tilt
+    return frame
+
+def station_geometry(tmy_data, sand_point, cache_dir=None, mmap_mode=None):
+    '''
+    Cached solar geometry for the whole TMY index of a station.
+    '''
+    return get_solar_geometry(tmy_data.index, sand_point.latitude, sand_point.longitude, sand_point.altitude, cache_dir=cache_dir, mmap_mode=mmap_mode)
+
+def _record_batch(tracker, index, angles, energy_out, cap, save_data):
+    '''
+    Records a whole-run calculate_energy output into the usual result tuple.
+    '''
+    sapm_out, ac, rad, pvtemps = energy_out
+
+    with get_profiler().stage('bookkeeping'):
+        #tracker starts flat, like the stepwise loop
+        old_tilts = np.concatenate(([0.], angles[:-1]))
+        energy_consumed_move = energy_motion(old_tilts, angles, cap)
 
-    angle_pos = pvlib.tracking.singleaxis(solpos['apparent_zenith'], solpos['azimuth'], backtrack=False)
+        recorder = ResultRecorder(index, save_data=save_data)
+        recorder.record(slice(None), angle=angles, move_energy=energy_consumed_move,
+                        ac=np.asarray(ac, dtype=float) - energy_consumed_move*1000, #kwh to wh
+                        temp_cell=np.asarray(pvtemps['temp_cell'], dtype=float), temp_module=np.asarray(pvtemps['temp_module'], dtype=float))
+        recorder.record_radiation(slice(None), rad)
 
-    surface_tilt = angle_pos['tracker_theta']
-    # print(surface_tilt)
-    if np.isnan(surface_tilt[0]):
-        #TODO: fix this wrt hour
-        surface_tilt = tracker.fallback_angle if hour > 12 else -tracker.fallback_angle
+        return recorder.results(tracker)
 
-    tracker_attributes = {'tracker_theta':surface_tilt, 'prev_angle':old_tilt}
+def _field_energy_out(field, angles, current_data, solpos, albedo, save_data):
+    '''
+    field_energy for the rotations angles, in the calculate_energy return layout
+    that _record_batch takes (no sapm_out).
+    '''
+    ac, parts = field_energy(field, angles, current_data, solpos, albedo, breakdown=True)
+    rad = np.column_stack([parts[name] for name in RADIATION_COLUMNS]) if save_data else None
+    return None, ac, rad, {'temp_cell': parts['temp_cell'], 'temp_module': parts['temp_module']}
 
-    sun_obj = OOMDPObject(sun_attributes, name="sun")
-    env_obj = OOMDPObject(env_attributes, name="env")
-    tracker_obj = OOMDPObject(tracker_attributes, name="tracker")
+def run_batch_on_tracker(tracker, tmy_data, sand_point, albedo, n_steps=500, geometry=None, save_data=True):
+    '''
+    Whole-year version of run_sim_on_tracker for trackers whose angle does not
+    depend on feedback (the ones implementing get_angles). Solar position, angles,
+    irradiance, SAPM and inverter output are computed once over all steps.
 
-    #passing list of objects for class!
-    objects = {'sun':[sun_obj], 'env':[env_obj], 'tracker':[tracker_obj]}
-    return OOMDPState(objects)
+    Returns the same tuple as run_sim_on_tracker, or a dict albedo -> tuple if
+    albedo is a sequence. Angles and the albedo free part of calculate_energy are
+    then shared by all albedos (albedo dependent trackers share their search).
 
-def run_sim_on_tracker(tracker, tmy_data, sand_point, albedo,  n_epochs=10, n_steps=500,):
+    Trackers with a field (field_geometry.FieldGeometry) are scored in that
+    field: its module orientation, with row shading on the beam.
+    '''
+    cap = module_capacity(get_module())
+    field = getattr(tracker, 'field', None)
+    profiler = get_profiler()
+    profiler.set_label(tracker.name)
+    profiler.count('steps', n_steps)
+
+    if geometry is None:
+        with profiler.stage('solar_geometry'):
+            geometry = station_geometry(tmy_data, sand_point)
+
+    current_data = tmy_data.iloc[0:n_steps]
+    solpos = geometry.iloc[0:n_steps]
+    multi = np.ndim(albedo) > 0
+    weather_args = (current_data['Wspd'], current_data['DryBulb'], current_data.index, solpos,  current_data['DHI'],  current_data['DNI'],  current_data['GHI'], tracker.name)
+
+    with profiler.stage('state'):
+        frame = tmy_to_frame(current_data, tracker, solpos, albedo[0] if multi else albedo)
+
+    if multi and getattr(tracker, 'albedo_dependent', False):
+        with profiler.stage('get_angle'):
+            angles_by_albedo = tracker.get_angles(frame, albedos=albedo)
+        results = {}
+        for a, angles in zip(albedo, angles_by_albedo):
+            surface_tilt = pd.Series(angles, index=current_data.index)
+            with profiler.stage('calculate_energy'):
+                if field is not None:
+                    energy_out = _field_energy_out(field, angles, current_data, solpos, a, save_data)
+                else:
+                    energy_out = calculate_energy(surface_tilt, tracker.get_azimuth(), a, *weather_args, save_data=save_data)
+            results[float(a)] = _record_batch(tracker, current_data.index, angles, energy_out, cap, save_data)
+        return results
+
+    with profiler.stage('get_angle'):
+        angles = np.asarray(tracker.get_angles(frame), dtype=float)
+    surface_tilt = pd.Series(angles, index=current_data.index)
+
+    with profiler.stage('calculate_energy'):
+        if field is None:
+            energy_out = calculate_energy(surface_tilt, tracker.get_azimuth(), albedo, *weather_args, save_data=save_data)
+        elif multi:
+            energy_out = {float(a): _field_energy_out(field, angles, current_data, solpos, a, save_data) for a in albedo}
+        else:
+            energy_out = _field_energy_out(field, angles, current_data, solpos, albedo, save_data)
+    if multi:
+        return {a: _record_batch(tracker, current_data.index, angles, out, cap, save_data) for a, out in energy_out.items()}
+    return _record_batch(tracker, current_data.index, angles, energy_out, cap, save_data)
+
+def run_sim_on_tracker(tracker, tmy_data, sand_point, albedo,  n_epochs=10, n_steps=500, batch=True, geometry=None, save_data=True):
     '''
     Returns power, angle history
 
+    Trackers that implement get_angles do not depend on feedback, so they are
+    simulated over all steps at once unless batch is False.
+
+    geometry is the station's cached solar geometry (see station_geometry).
+    save_data is passed to calculate_energy and also decides whether the
+    radiation breakdown is recorded (radiation is None without it).
+
+    albedo may be a sequence, the result is then a dict albedo -> tuple. Batch
+    trackers evaluate all albedos in one pass, stepwise trackers run once per
+    albedo on a fresh copy so learning does not leak between albedos.
+
+    Stage timings go to the active profiler (see instrumentation.set_profiler).
     '''
+    profiler = get_profiler()
+    profiler.set_label(tracker.name)
+    if geometry is None:
+        with profiler.stage('solar_geometry'):
+            geometry = station_geometry(tmy_data, sand_point)
+
+    if batch and hasattr(tracker, 'get_angles'):
+        return run_batch_on_tracker(tracker, tmy_data, sand_point, albedo, n_steps=n_steps, geometry=geometry, save_data=save_data)
+
+    if np.ndim(albedo) > 0:
+        return {float(a): run_sim_on_tracker(copy.deepcopy(tracker), tmy_data, sand_point, a, n_epochs=n_epochs, n_steps=n_steps, batch=batch, geometry=geometry, save_data=save_data) for a in albedo}
+
     # print("running {} \n".format(tracker.name))
-    sandia_modules = retrieve_sam('sandiamod')
-    cec_inverters = retrieve_sam('cecinverter')
-    module = sandia_modules['Canadian_Solar_CS5P_220M___2009_']
-    cap = float(module['Isco']*module['Voco']/(10**6)) #convert to MW
+    cap = module_capacity(get_module())
+
+    with profiler.stage('state'):
+        features = features_from_frame(tmy_to_frame(tmy_data.iloc[0:n_steps], tracker, geometry.iloc[0:n_steps], albedo))
+        datetimes = np.asarray(tmy_data.index[0:n_steps].view('int64'))
+        #plain float inputs for the per-step energy_arrays calls
+        step_inputs = {col: np.asarray(tmy_data[col].values[0:n_steps], dtype=float) for col in ['Wspd', 'DryBulb', 'DHI', 'DNI', 'GHI']}
+        step_inputs['dayofyear'] = np.asarray(tmy_data.index[0:n_steps].dayofyear)
+        for col in ['apparent_zenith', 'azimuth']:
+            step_inputs[col] = np.asarray(geometry[col].values[0:n_steps], dtype=float)
     #TODO: save previous state/reward
     for e in range(n_epochs):
         #returning results from most recent epoch
-        #TODO: avoid successive concats
-        total = pd.DataFrame()
-        angles = np.zeros((n_steps,))
-        energy_consumed_move = np.zeros((n_steps,))
-        temps = pd.DataFrame()
-        radiation_rows = []
-        ac_all = np.zeros((n_steps,))
+        recorder = ResultRecorder(tmy_data.index[0:n_steps], save_data=save_data)
         surface_azimuth = tracker.get_azimuth()
+        field = getattr(tracker, 'field', None)
         old_tilt = 0
         prev_reward = 0
+        profiler.count('steps', n_steps)
         for i in range(n_steps):
-            print(i)
-            current_step_data = tmy_data[tmy_data.index[i]:tmy_data.index[i]]
-
-            solpos = pvlib.solarposition.get_solarposition(current_step_data.index, sand_point.latitude, sand_point.longitude)
-
-
-            state = tmy_step_to_OOMDP(current_step_data, tracker, solpos, old_tilt, albedo)
-
-            surface_tilt = float(tracker.get_angle(state, prev_reward))
-            angles[i] = surface_tilt
-
-            sapm_out, ac, rad_timestep, pvtemps = calculate_energy(surface_tilt, surface_azimuth, albedo, current_step_data['Wspd'], current_step_data['DryBulb'], current_step_data.index, solpos,  current_step_data['DHI'],  current_step_data['DNI'],  current_step_data['GHI'], tracker.name)
-
-            radiation_rows.append(rad_timestep)
-
-            eng_consumed_move = energy_motion(old_tilt, surface_tilt, cap)
-            old_tilt = surface_tilt
-            prev_reward = float(ac) - eng_consumed_move*1000
-            energy_consumed_move[i] = eng_consumed_move
-
-            ac_all[i] = ac - eng_consumed_move*1000 #kwh to wh
-            temps = temps.append(pvtemps)
-
-
-    #convert angles to df
-    angles_series = pd.Series(angles, index=tmy_data.index[0:n_steps])
-    energy_consumed = pd.Series(energy_consumed_move, index=tmy_data.index[0:n_steps])
-
-    radiation = pd.concat(radiation_rows, axis=0)
-    #rename
-    temps.rename(columns={'temp_cell': 'cell temp {}'.format(tracker.name)}, inplace=True)
-
-    angles_df = pd.DataFrame(angles_series, columns=['angle {}'.format(tracker.name)])
-    energy_consumed_df = pd.DataFrame(energy_consumed, columns=['energy consumed {}'.format(tracker.name)])
-
-    ac_total = pd.Series(ac_all, index=tmy_data.index[0:n_steps])
-    sum = ac_total.sum()
-
-    ac_df = pd.DataFrame(ac_total, columns=['ac_step'])
-    ac_df['p cumulative {}'.format(tracker.name)] = ac_df.cumsum()
-
-    return ac_df, angles_df, temps, energy_consumed_df, radiation, sum
-
-def save_results(results, albedo, output_loc, tmy_id, steps, tmy_loc_name):
+            with profiler.stage('state'):
+                #state features for every step are built once, only prev_angle changes
+                data = features[i].copy()
+                data[PREV_ANGLE] = old_tilt
+                state = TrackerState(data, datetime=datetimes[i:i+1])
+
+            with profiler.stage('get_angle'):
+                surface_tilt = float(tracker.get_angle(state, prev_reward))
+
+            with profiler.stage('calculate_energy'):
+                #same chain as calculate_energy without the pandas overhead
+                module_tilt, module_azimuth, shaded = surface_tilt, surface_azimuth, None
+                if field is not None:
+                    shaded = field.shaded_fraction(surface_tilt, step_inputs['apparent_zenith'][i], step_inputs['azimuth'][i])
+                    module_tilt, module_azimuth = field.surface_orientation(surface_tilt)
+                ac, parts = energy_arrays(module_tilt, module_azimuth, albedo, step_inputs['Wspd'][i], step_inputs['DryBulb'][i], step_inputs['dayofyear'][i],
+                                          step_inputs['apparent_zenith'][i], step_inputs['azimuth'][i], step_inputs['DHI'][i], step_inputs['DNI'][i], step_inputs['GHI'][i],
+                                          breakdown=True, shaded_fraction=shaded)
+
+            with profiler.stage('bookkeeping'):
+                eng_consumed_move = energy_motion(old_tilt, surface_tilt, cap)
+                old_tilt = surface_tilt
+                prev_reward = float(ac) - eng_consumed_move*1000
+
+                recorder.record(i, angle=surface_tilt, move_energy=eng_consumed_move, ac=prev_reward, #kwh to wh
+                                temp_cell=float(parts['temp_cell']), temp_module=float(parts['temp_module']))
+                if save_data:
+                    recorder.record_radiation(i, [parts[name] for name in RADIATION_COLUMNS])
+
+    return recorder.results(tracker)
+
+def write_summary(sums, albedo, output_loc, tmy_id, steps, tmy_loc_name, timings=None):
+    '''
+    sums maps tracker name -> total energy. timings are extra lines from
+    Profiler.summary_lines, appended after the results.
+    '''
     #printing results values
     outstrings = [tmy_id, str(albedo), str(steps), tmy_loc_name]
-    for name, res in results.items():
-        outstrings.append("{} produced by {}".format(res[5], name))
+    for name, total in sums.items():
+        outstrings.append("{} produced by {}".format(total, name))
+    if timings:
+        outstrings.extend(timings)
 
     with open("{}/summary_{}_{}.txt".format(output_loc, tmy_id, albedo), 'w') as f:
         f.write("\n".join(outstrings))
 
-def generate_plots(results, albedo, output_loc, tmy_id, steps, tmy_loc_name):
-
-    fig, ((ax, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(50,50))
-
-    for name, res in results.items():
-        res[0][['p cumulative {}'.format(name)]].plot(ax=ax)
-        res[1][['angle {}'.format(name)]].plot(ax=ax2)
-        res[2][['cell temp {}'.format(name)]].plot(ax=ax3)
-        res[3][['energy consumed {}'.format(name)]].plot(ax=ax4)
-
-    ax.set_ylabel("Cumulative Energy (Wh)")
-    ax2.set_ylabel("angle (deg)")
-    ax3.set_ylabel("cell temp (Deg C)")
-    ax4.set_ylabel("energy consumed (kwh)")
-    plt.savefig("{}/{}_{}_tmy_results.png".format(output_loc, tmy_id, albedo))
-    plt.close()
-
-    f, ((ax5, ax6), (ax7, ax8)) = plt.subplots(2, 2, figsize=(50,50))
-
-
-    #plotting radiation breakdown
-    for name, res in results.items():
-        res[4][["dni extra {}".format(name)]].plot(ax=ax5)
-        res[4][["sky diffuse {}".format(name)]].plot(ax=ax6)
-        res[4][["ground diffuse {}".format(name)]].plot(ax=ax7)
-        res[4][["poa direct {}".format(name)]].plot(ax=ax8)
-
-    ax5.set_ylabel("Irradiance (W)")
-    ax6.set_ylabel("Irradiance (W)")
-    ax7.set_ylabel("Irradiance (W)")
-    ax8.set_ylabel("Irradiance (W)")
-    plt.savefig("{}/{}_{}_tmy_rad_breakdown.png".format(output_loc, tmy_id, albedo))
+def save_results(results, albedo, output_loc, tmy_id, steps, tmy_loc_name, timings=None):
+    write_summary({name: res[5] for name, res in results.items()}, albedo, output_loc, tmy_id, steps, tmy_loc_name, timings=timings)
 
+def load_station(loc, mmap_mode='r'):
+    '''
+    Loads everything about a station that does not depend on tracker or albedo.
+    Returns tmy_data, meta, sand_point (pvlib Location), geometry.
 
-    #printing results values
-    outstrings = [tmy_id, str(albedo), str(steps), tmy_loc_name]
-    for name, res in results.items():
-        outstrings.append("{} produced by {}".format(res[5], name))
+    Cached TMY and geometry arrays are memory-mapped read-only with the default
+    mmap_mode, so Pool workers on the same station share them. Stations the
+    parent published with shared_data.SharedStations are attached from shared
+    memory instead.
+    '''
+    shared = attached_station(loc)
+    if shared is not None:
+        tmy_data, meta, geometry = shared
+    else:
+        tmy_data, meta = read_tmy(loc, mmap_mode=mmap_mode)
 
-    with open("{}/summary_{}_{}.txt".format(output_loc, tmy_id, albedo), 'w') as f:
-        f.write("\n".join(outstrings))
+    # create pvlib Location object based on meta data
+    #TODO: add this to logs
+    sand_point = pvlib.location.Location(meta['latitude'], meta['longitude'], tz=meta['TZ'],
+                                         altitude=meta['altitude'], name=meta['Name'].replace('"',''))
 
-def run(loc, albedo, output_loc, name, steps=1000):
-    #TODO: test with different fixed trackers
-    fixed = FixedPolicyTracker(30, 90) #azimuth angle
-    rand = RandomTracker(-70, 90, 90)
-    astro = AstroTracker(90)
-    ucb = LinUCBTracker(90, context_size=13)
-    sarsa = SARSATracker(90, 13)
-    optimal = OptimalTracker(90)
+    if shared is None:
+        #computed once (or loaded from the cache next to the TMY file) and shared by all trackers
+        geometry = station_geometry(tmy_data, sand_point, cache_dir=default_cache_dir(loc), mmap_mode=mmap_mode)
+    return tmy_data, meta, sand_point, geometry
 
-    trackers = [astro, optimal]
+#tracker keys (see trackers.TRACKER_FACTORIES) simulated by default
+#TODO: test with different fixed trackers
+DEFAULT_TRACKERS = ['astro', 'optimal']
 
-    tmy_data, meta = pvlib.tmy.readtmy3(filename=loc)
+def run(loc, albedo, output_loc, name, steps=1000, trackers=None, profile=False, store=None, cache=None):
+    '''
+    albedo may be a sequence, all albedos are then simulated in a single pass
+    and one summary is written per albedo.
+
+    With profile, per tracker stage timings are appended to the summaries.
+    With store (a results_store root), every run's series and scalars are also
+    written there, plot_results draws from it offline.
+    With cache (a result_cache.ResultCache), runs of cacheable trackers whose
+    inputs and configuration did not change are reused instead of recomputed.
+    '''
+    previous = set_profiler(Profiler() if profile else None)
+    try:
+        _run(loc, albedo, output_loc, name, steps, trackers, store, cache)
+    finally:
+        set_profiler(previous)
 
+def _run(loc, albedo, output_loc, name, steps, trackers, store=None, cache=None):
+    if trackers is None:
+        trackers = DEFAULT_TRACKERS
+    built = [(key, make_tracker(key)) for key in trackers]
+    keys = {tracker.name: key for key, tracker in built}
+    trackers = [tracker for _, tracker in built]
 
-    # create pvlib Location object based on meta data
-    #TODO: add this to logs
-    sand_point = pvlib.location.Location(meta['latitude'], meta['longitude'], tz=meta['TZ'],
-                                         altitude=meta['altitude'], name=meta['Name'].replace('"',''))
+    tmy_data, meta, sand_point, geometry = load_station(loc)
 
     if steps=="max":
         steps = len(tmy_data.index)
+
+    albedos = [float(a) for a in albedo] if np.ndim(albedo) > 0 else [float(albedo)]
+    run_albedos = lambda tracker: lambda pending: run_sim_on_tracker(tracker, tmy_data, sand_point, pending, n_epochs=1, n_steps=steps, geometry=geometry)
+
     # print("starting simulation")
-    results = {tracker.name:run_sim_on_tracker(tracker, tmy_data, sand_point, albedo, n_epochs=1, n_steps=steps) for tracker in trackers}
+    results = {tracker.name: cached_run(cache, loc, tracker, albedos, steps, run_albedos(tracker)) for tracker in trackers}
     # print("done 1")
-    save_results(results, albedo, output_loc, meta['State'] , steps, meta['Name'])
+    timings = get_profiler().summary_lines()
+    #keyed by station id, several stations share a state
+    per_albedo = {a: {tracker_name: res[a] for tracker_name, res in results.items()} for a in albedos}
+    for a, albedo_results in per_albedo.items():
+        save_results(albedo_results, a, output_loc, name, steps, meta['Name'], timings=timings)
+        if store is not None:
+            for tracker_name, res in albedo_results.items():
+                write_run(store, name, a, keys[tracker_name], tracker_name, res, steps, tmy_loc_name=meta['Name'], timings=timings)
     print("simulation complete!")
 
 if __name__=="__main__":
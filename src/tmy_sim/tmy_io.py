@@ -0,0 +1,131 @@
+#fast TMY3 loading: parses only the columns the simulator uses and caches them
+#as memory-mappable .npy files with a json sidecar
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pytz
+
+#raw TMY3 header -> name used by the simulator (same names as pvlib.tmy.readtmy3)
+TMY_COLUMNS = [('GHI (W/m^2)', 'GHI'), ('DNI (W/m^2)', 'DNI'), ('DHI (W/m^2)', 'DHI'),
+               ('Wspd (m/s)', 'Wspd'), ('Dry-bulb (C)', 'DryBulb'),
+               ('TotCld (tenths)', 'TotCld'), ('OpqCld (tenths)', 'OpqCld')]
+META_HEAD = ['USAF', 'Name', 'State', 'TZ', 'latitude', 'longitude', 'altitude']
+CACHE_VERSION = 1
+#cache folder created next to the TMY files
+CACHE_FOLDER = ".tmy_cache"
+
+def default_cache_dir(loc):
+    return os.path.join(os.path.dirname(os.path.abspath(loc)), CACHE_FOLDER)
+
+def file_hash(loc):
+    h = hashlib.sha1()
+    with open(loc, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def parse_tmy3(loc):
+    '''
+    Reads the metadata line and the used columns of a TMY3 CSV.
+    Index and meta match pvlib.tmy.readtmy3.
+    '''
+    with open(loc, 'r') as f:
+        meta = dict(zip(META_HEAD, f.readline().rstrip('\n').split(",")))
+    meta['USAF'] = int(meta['USAF'])
+    for key in ['TZ', 'latitude', 'longitude', 'altitude']:
+        meta[key] = float(meta[key])
+
+    raw = pd.read_csv(loc, header=1, usecols=['Date (MM/DD/YYYY)', 'Time (HH:MM)'] + [col for col, _ in TMY_COLUMNS])
+
+    #hour ending timestamps, 24:00 rolls over to the next day like readtmy3
+    dates = pd.to_datetime(raw['Date (MM/DD/YYYY)'], format='%m/%d/%Y')
+    hours = raw['Time (HH:MM)'].str.slice(0, 2).astype(int)
+    index = pd.DatetimeIndex(dates + pd.to_timedelta(hours, unit='h'))
+    index = index.tz_localize(pytz.FixedOffset(int(meta['TZ']*60)))
+
+    values = np.column_stack([raw[col].values.astype(np.float64) for col, _ in TMY_COLUMNS])
+    return values, index, meta
+
+def _paths(loc, cache_dir):
+    name = os.path.basename(loc)
+    base = os.path.join(cache_dir, name)
+    return base + ".values.npy", base + ".index.npy", base + ".json"
+
+def _save_npy(path, values):
+    #write then rename so parallel workers never see a partial file
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+def _write_cache(loc, cache_dir, values, index, meta, source_hash):
+    os.makedirs(cache_dir, exist_ok=True)
+    values_path, index_path, sidecar_path = _paths(loc, cache_dir)
+    _save_npy(values_path, values)
+    _save_npy(index_path, np.asarray(index.view('int64')))
+
+    stat = os.stat(loc)
+    sidecar = {'version': CACHE_VERSION, 'source_mtime': stat.st_mtime, 'source_size': stat.st_size,
+               'source_sha1': source_hash, 'columns': [name for _, name in TMY_COLUMNS],
+               'tz_offset_minutes': int(meta['TZ']*60), 'meta': meta}
+    tmp_path = "{}.{}.tmp".format(sidecar_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(sidecar, f)
+    os.replace(tmp_path, sidecar_path)
+    return sidecar
+
+def _read_sidecar(loc, cache_dir):
+    values_path, index_path, sidecar_path = _paths(loc, cache_dir)
+    if not (os.path.exists(values_path) and os.path.exists(index_path) and os.path.exists(sidecar_path)):
+        return None
+    with open(sidecar_path, 'r') as f:
+        sidecar = json.load(f)
+    if sidecar.get('version') != CACHE_VERSION or sidecar.get('columns') != [name for _, name in TMY_COLUMNS]:
+        return None
+    return sidecar
+
+def _is_fresh(loc, cache_dir, sidecar):
+    '''
+    mtime/size decide quickly, the content hash settles touched-but-unchanged files.
+    '''
+    stat = os.stat(loc)
+    if stat.st_mtime == sidecar['source_mtime'] and stat.st_size == sidecar['source_size']:
+        return True
+    if stat.st_size != sidecar['source_size'] or file_hash(loc) != sidecar['source_sha1']:
+        return False
+
+    sidecar['source_mtime'] = stat.st_mtime
+    sidecar_path = _paths(loc, cache_dir)[2]
+    tmp_path = "{}.{}.tmp".format(sidecar_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(sidecar, f)
+    os.replace(tmp_path, sidecar_path)
+    return True
+
+def read_tmy(loc, cache_dir=None, use_cache=True, mmap_mode='r'):
+    '''
+    Drop-in replacement for pvlib.tmy.readtmy3 restricted to the simulator's
+    columns. Returns (tmy_data, meta).
+
+    The first load converts the CSV into a binary cache in cache_dir (by default
+    a .tmy_cache folder next to the file), later loads memory-map it. Entries are
+    rebuilt when the source file changed.
+    '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir(loc)
+
+    sidecar = _read_sidecar(loc, cache_dir) if use_cache else None
+    if sidecar is not None and _is_fresh(loc, cache_dir, sidecar):
+        values_path, index_path, _ = _paths(loc, cache_dir)
+        values = np.load(values_path, mmap_mode=mmap_mode)
+        index = pd.DatetimeIndex(np.load(index_path), tz='UTC').tz_convert(pytz.FixedOffset(sidecar['tz_offset_minutes']))
+        meta = sidecar['meta']
+    else:
+        values, index, meta = parse_tmy3(loc)
+        if use_cache:
+            _write_cache(loc, cache_dir, values, index, meta, file_hash(loc))
+
+    tmy_data = pd.DataFrame(values, index=index, columns=[name for _, name in TMY_COLUMNS])
+    return tmy_data, meta
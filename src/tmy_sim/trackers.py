@@ -1,10 +1,13 @@
 import simple_rl as rl
 import numpy as np
 from energy_calcs import *
-from tqdm import tqdm
-from random import randint
+from state import NUM_FEATURES, PREV_ANGLE, FEATURE_SCALES, FEATURE_INDEX, TrackerState
+from components import module_capacity
 
 class FixedPolicyTracker:
+    #no learned state, results can be reused (see result_cache)
+    cacheable = True
+
     def __init__(self, angle, azimuth):
         self.name="Fixed at {}".format(angle)
         self.angle = angle
@@ -12,38 +15,52 @@ class FixedPolicyTracker:
         self.fallback_angle = 0
     def get_angle(self, state):
         return self.angle
+    def get_angles(self, frame):
+        return np.full(len(frame), self.angle, dtype=float)
     def get_azimuth(self):
         return self.azimuth
 
 
+#trackers with randomness draw from rng (a np.random.RandomState), the global
+#np.random state by default
 class RandomTracker:
-    def __init__(self, min, max, azimuth):
+    def __init__(self, min, max, azimuth, rng=None):
         self.name="Random from {} to {}".format(min, max)
         self.max = max
         self.min = min
         self.azimuth = azimuth
         self.fallback_angle= 0
+        self.rng = np.random if rng is None else rng
     def get_angle(self, state, reward):
-        return randint(self.min, self.max)
+        #randint is exclusive of max
+        return self.rng.randint(self.min, self.max + 1)
+    def get_angles(self, frame):
+        return self.rng.randint(self.min, self.max + 1, size=len(frame))
     def get_azimuth(self):
         return self.azimuth
 
 class AstroTracker:
-    def __init__(self, azimuth, fallback_angle=30):
+    #not cacheable: its angles carry rng noise, a cached run would replay one draw
+    def __init__(self, azimuth, fallback_angle=30, rng=None):
         self.name="astronomical"
         self.azimuth = azimuth
         self.fallback_angle = fallback_angle
+        self.rng = np.random if rng is None else rng
     def get_angle(self, state, reward):
 
         # angle_pos = pvlib.tracking.singleaxis(zenith, azi, backtrack=False)
-        surface_tilt = state.get_objects_of_class('tracker')[0]['tracker_theta']
+        surface_tilt = state['tracker_theta']
         # if np.isnan(surface_tilt[0]):
         #     #TODO: fix this
         #     surface_tilt = self.fallback_angle
         #adding noise
-        noise = np.random.normal(loc=0, scale=1.5)
+        noise = self.rng.normal(loc=0, scale=1.5)
 
         return surface_tilt + noise
+    def get_angles(self, frame):
+        noise = self.rng.normal(loc=0, scale=1.5, size=len(frame))
+
+        return frame['tracker_theta'].values + noise
     def get_azimuth(self):
         return self.azimuth
 
@@ -70,19 +87,61 @@ class LinUCBTracker:
 
     def get_angle(self, context, prev_reward):
         '''
-        Uses RL agent!
+        Uses RL agent! context is a TrackerState, its features() are the LinUCB context.
         '''
         action = self.agent.act(context, prev_reward)
 
         angle = self.action_dict[action]
         return angle
 
+    def reset_batch(self):
+        '''
+        Forgets the pending batch actions (start of new episodes), keeps what was learned.
+        '''
+        self._batch_prev = None
+
+    def act(self, contexts, rewards):
+        '''
+        Batch form of get_angle for K episodes in lockstep (see vec_env.TMYVecEnv).
+        contexts is (K x context_size), rewards the K rewards of the previous
+        actions. The K episodes share one LinUCB model, every transition updates it.
+        Kept separate from the simple_rl agent used by get_angle.
+
+        Contexts are divided by FEATURE_SCALES, like SARSATracker.act, so the
+        identity prior and alpha are on the same footing for every feature.
+        contexts None ends the episodes: the last rewards are learned and
+        nothing is returned.
+        '''
+        if getattr(self, '_batch_A', None) is None:
+            self._batch_A = np.tile(np.identity(self.context_size), (len(self.angles), 1, 1))
+            self._batch_b = np.zeros((len(self.angles), self.context_size))
+            self._batch_prev = None
+
+        if getattr(self, '_batch_prev', None) is not None:
+            prev_contexts, prev_actions = self._batch_prev
+            rewards = np.asarray(rewards, dtype=float)
+            np.add.at(self._batch_A, prev_actions, np.einsum('ki,kj->kij', prev_contexts, prev_contexts))
+            np.add.at(self._batch_b, prev_actions, rewards[:, None]*prev_contexts)
+        if contexts is None:
+            self._batch_prev = None
+            return None
+
+        contexts = np.asarray(contexts, dtype=float)/FEATURE_SCALES
+        A_inv = np.linalg.inv(self._batch_A)
+        theta = np.einsum('aij,aj->ai', A_inv, self._batch_b)
+        scores = contexts @ theta.T + self.alpha*np.sqrt(np.einsum('ki,aij,kj->ka', contexts, A_inv, contexts))
+        actions = np.argmax(scores, axis=1)
+
+        self._batch_prev = (contexts, actions)
+        return self.angles[actions]
+
 #TODO: experiment with action space for both stepwise and bandit actions
 #TODO: test with delta reward
 class SARSATracker:
-    def __init__(self, azimuth, num_features, limits = (-70, 70), action_step = 5):
+    def __init__(self, azimuth, num_features, limits = (-70, 70), action_step = 5, rng=None):
         self.name="SARSA"
         self.azimuth = azimuth
+        self.rng = np.random if rng is None else rng
         self.fallback_angle = 30
         self.action_step = action_step
         self.limits = limits
@@ -99,7 +158,7 @@ class SARSATracker:
         '''
         action = self.agent.act(state, prev_reward)
 
-        prev_angle = state.get_objects_of_class('tracker')[0]['prev_angle']
+        prev_angle = state['prev_angle']
         new_angle = prev_angle
         if action == "inc":
             new_angle += self.action_step
@@ -111,38 +170,196 @@ class SARSATracker:
 
         return new_angle
 
+    def reset_batch(self):
+        '''
+        Forgets the pending batch actions (start of new episodes), keeps what was learned.
+        '''
+        self._batch_prev = None
+
+    def act(self, states, rewards, lr=0.2, gamma=0.99, epsilon=0.1):
+        '''
+        Batch form of get_angle for K episodes in lockstep (see vec_env.TMYVecEnv).
+        states is (K x num_features) with prev_angle at PREV_ANGLE. One linear
+        SARSA model (a weight vector per action) is shared by the K episodes.
+        Kept separate from the simple_rl agent used by get_angle.
+
+        The raw features range from degrees to W/m^2, so the model sees them
+        divided by FEATURE_SCALES, and every TD step is normalized by |x|^2 (and
+        averaged over the episodes that took the same action). An update that
+        would leave non-finite weights is dropped.
+
+        states None ends the episodes: the last rewards are learned as terminal
+        transitions (no bootstrap) and nothing is returned.
+        '''
+        if states is not None:
+            states = np.asarray(states, dtype=float)
+            features = states/FEATURE_SCALES
+            if getattr(self, '_batch_w', None) is None:
+                self._batch_w = np.zeros((3, states.shape[1]))
+                self._batch_prev = None
+
+            #epsilon greedy over inc, dec, same
+            q = features @ self._batch_w.T
+            actions = np.argmax(q, axis=1)
+            explore = self.rng.random_sample(len(states)) < epsilon
+            actions[explore] = self.rng.randint(0, 3, size=int(explore.sum()))
+
+        if getattr(self, '_batch_prev', None) is not None:
+            prev_states, prev_actions = self._batch_prev
+            rewards = np.asarray(rewards, dtype=float)
+            next_q = gamma*q[np.arange(len(states)), actions] if states is not None else 0.
+            td = rewards + next_q - np.einsum('ki,ki->k', prev_states, self._batch_w[prev_actions])
+            norm = np.einsum('ki,ki->k', prev_states, prev_states)*np.bincount(prev_actions, minlength=3)[prev_actions]
+            weights = self._batch_w.copy()
+            np.add.at(weights, prev_actions, (lr*td/np.maximum(norm, 1e-12))[:, None]*prev_states)
+            if np.all(np.isfinite(weights)):
+                self._batch_w = weights
+        if states is None:
+            self._batch_prev = None
+            return None
+        self._batch_prev = (features, actions)
+
+        prev_angle = states[:, PREV_ANGLE]
+        new_angle = prev_angle + np.array([self.action_step, -self.action_step, 0])[actions]
+        return np.where((new_angle < self.limits[0]) | (new_angle > self.limits[1]), prev_angle, new_angle)
+
 class OptimalTracker:
     '''
     Scans every possible angle for the best configuration.
+
+    All candidates are scored in one (angles x time) broadcast. With coarse_step
+    set, every coarse_step-th candidate is scored first and only the neighbourhood
+    of the coarse optimum is scored on the full grid, so fine grids
+    (e.g. bins=201 for 0.5 deg) cost roughly sqrt(bins) evaluations per step.
+
+    The best angle depends on albedo, so search/get_angles also take a sequence
+    of albedos and return one row per albedo, sharing the albedo free part.
+
+    With field (a field_geometry.FieldGeometry), candidates are rotations in
+    that field and are scored with row shading.
     '''
-    def __init__(self, azimuth, limits=(-50, 50), bins=50):
+    albedo_dependent = True
+    cacheable = True
+
+    def __init__(self, azimuth, limits=(-50, 50), bins=50, coarse_step=None, chunk_size=1000, field=None):
         self.name="Optimal"
         self.azimuth = azimuth
         self.fallback_angle = 30
         self.configurations = np.linspace(limits[0], limits[1], num=bins)
+        self.coarse_step = coarse_step
+        self.chunk_size = chunk_size
+        self.field = field
 
     def get_azimuth(self):
         return self.azimuth
 
+    def _best(self, candidates, args):
+        '''
+        argmax over the candidate axis. First candidate wins ties, non-positive
+        (or nan) power keeps angle 0.
+        '''
+        #candidates are on axis -2, an albedo axis may lead
+        ac = np.nan_to_num(calculate_energy_grid(candidates, self.azimuth, *args, field=self.field))
+        best = np.argmax(ac, axis=-2)
+        max_pwr = np.take_along_axis(ac, best[..., None, :], axis=-2)[..., 0, :]
+        if candidates.ndim == 1:
+            max_angle = candidates[best]
+        else:
+            max_angle = np.take_along_axis(np.broadcast_to(candidates, ac.shape), best[..., None, :], axis=-2)[..., 0, :]
+        return best, max_angle, max_pwr
+
+    def search(self, albedo, wspd, drybulb, current_index, solpos, dhi, dni, ghi):
+        '''
+        Returns the best angle and its ac power for every step of the inputs
+        (albedos x steps if albedo is a sequence).
+        '''
+        args = (albedo, wspd, drybulb, current_index, solpos, dhi, dni, ghi)
+        if self.coarse_step is None or self.coarse_step <= 1:
+            _, max_angle, max_pwr = self._best(self.configurations, args)
+        else:
+            n = len(self.configurations)
+            coarse = np.unique(np.append(np.arange(0, n, self.coarse_step), n - 1))
+            best, _, _ = self._best(self.configurations[coarse], args)
+
+            #refine on the full grid around the coarse optimum
+            offsets = np.arange(-self.coarse_step + 1, self.coarse_step)
+            fine = np.clip(coarse[best][..., None, :] + offsets[:, None], 0, n - 1)
+            _, max_angle, max_pwr = self._best(self.configurations[fine], args)
+
+        return np.where(max_pwr > 0, max_angle, 0), np.where(max_pwr > 0, max_pwr, 0)
+
     def get_angle(self, state, prev_reward):
         '''
         Slow and steady hopefully wins the race.
         '''
+        current_index = pd.to_datetime(state['datetime'])
 
-        current_index = pd.to_datetime(state.get_objects_of_class('env')[0]['datetime'])
+        max_angle, _ = self.search(state['albedo'], state['Wspd'], state['DryBulb'], current_index,
+                                   {'apparent_zenith': state['apparent_zenith'], 'azimuth': state['azimuth']},
+                                   state['DHI'], state['DNI'], state['GHI'])
+        return max_angle[0]
 
-        max_pwr = 0
-        max_angle = 0
-        for config in self.configurations:
-            _,ac,  _, _ = calculate_energy(config,
-                                        self.azimuth,
-                                        state.get_objects_of_class('env')[0]['albedo'],
-                                        state.get_objects_of_class('env')[0]['Wspd'],
-                                        state.get_objects_of_class('env')[0]['DryBulb'],
-                                        current_index, state.get_objects_of_class('sun')[0], state.get_objects_of_class('env')[0]['DHI'], state.get_objects_of_class('env')[0]['DNI'], state.get_objects_of_class('env')[0]['GHI'], "", save_data=False)
+    def get_angles(self, frame, albedos=None):
+        '''
+        Same scan as get_angle for every step of the frame, in chunks of
+        chunk_size steps to bound the (angles x time) working set.
+        With albedos, returns an (albedos x steps) array instead.
+        '''
+        albedo = frame['albedo'].iloc[0] if albedos is None else np.asarray(albedos, dtype=float)
+        angles = np.zeros(np.shape(albedo) + (len(frame),))
+        for start in range(0, len(frame), self.chunk_size):
+            chunk = frame.iloc[start:start + self.chunk_size]
+            angles[..., start:start + len(chunk)], _ = self.search(albedo, chunk['Wspd'], chunk['DryBulb'], chunk.index,
+                                                                   chunk, chunk['DHI'], chunk['DNI'], chunk['GHI'])
+        return angles
 
-            if float(ac) > max_pwr:
-                max_pwr = float(ac)
-                max_angle = config
+def reward_oracle(angles, states, surface_azimuth, dayofyear=None, module=None, inverter=None, field=None):
+    '''
+    Reward of moving to angles in states, as run_sim_on_tracker pays it: ac of
+    energy_arrays minus the motion energy (Wh) from the state's prev_angle.
 
-        return max_angle
+    states is a TrackerState, a NUM_FEATURES vector or a (steps x NUM_FEATURES)
+    matrix, angles broadcasts against the steps (e.g. candidates x steps), so
+    any tracker can score what-if angles exactly. dayofyear comes from the
+    TrackerState's datetime, plain feature arrays need it passed. With field,
+    angles are rotations in that field_geometry.FieldGeometry.
+    '''
+    if module is None:
+        module = get_module()
+    if isinstance(states, TrackerState):
+        if dayofyear is None:
+            dayofyear = pd.DatetimeIndex(states.datetime).dayofyear
+        states = states.features()
+    elif dayofyear is None:
+        raise ValueError("reward_oracle needs dayofyear for states without a datetime")
+    states = np.asarray(states, dtype=float)
+    feature = lambda name: states[..., FEATURE_INDEX[name]]
+
+    angles = np.asarray(angles, dtype=float)
+    surface_tilt, shaded = angles, None
+    if field is not None:
+        shaded = field.shaded_fraction(angles, feature('apparent_zenith'), feature('azimuth'))
+        surface_tilt, surface_azimuth = field.surface_orientation(angles)
+    ac = energy_arrays(surface_tilt, surface_azimuth, feature('albedo'), feature('Wspd'), feature('DryBulb'), np.asarray(dayofyear),
+                       feature('apparent_zenith'), feature('azimuth'), feature('DHI'), feature('DNI'), feature('GHI'),
+                       module=module, inverter=inverter, shaded_fraction=shaded)
+    return ac - energy_motion(feature('prev_angle'), angles, module_capacity(module))*1000 #kwh to wh
+
+#default configuration of each tracker, by the short name used in sweeps
+TRACKER_FACTORIES = {
+    'fixed': lambda: FixedPolicyTracker(30, 90),
+    'random': lambda: RandomTracker(-70, 90, 90),
+    'astro': lambda: AstroTracker(90),
+    'ucb': lambda: LinUCBTracker(90, context_size=NUM_FEATURES),
+    'sarsa': lambda: SARSATracker(90, NUM_FEATURES),
+    'optimal': lambda: OptimalTracker(90),
+}
+
+def make_tracker(key, rng=None):
+    '''
+    rng (a np.random.RandomState) replaces the global np.random state of trackers that draw random numbers.
+    '''
+    tracker = TRACKER_FACTORIES[key]()
+    if rng is not None and hasattr(tracker, 'rng'):
+        tracker.rng = rng
+    return tracker
@@ -0,0 +1,128 @@
+#vectorized environment: K independent TMY episodes (stations, albedos, start
+#steps) stepped in lockstep, with batched observations and rewards
+import numpy as np
+import pandas as pd
+from tmy import tmy_to_frame, load_station
+from state import features_from_frame, PREV_ANGLE
+from energy_calcs import calculate_energy_grid, energy_motion
+from components import get_module, get_inverter, module_capacity
+
+class Episode:
+    '''
+    One episode: n_steps of a station's weather from start, at albedo.
+    '''
+    __slots__ = ('tmy_data', 'geometry', 'albedo', 'start')
+
+    def __init__(self, tmy_data, geometry, albedo, start=0):
+        self.tmy_data = tmy_data
+        self.geometry = geometry
+        self.albedo = albedo
+        self.start = start
+
+class TMYVecEnv:
+    '''
+    Gym style vectorized environment over TMY data.
+
+    reset() returns the (K x NUM_FEATURES) observations of the first step,
+    step(angles) takes one angle per episode and returns the next observations,
+    the K rewards (ac minus motion energy in Wh, as in run_sim_on_tracker), done
+    and an info dict. All episodes have n_steps steps, so they finish together.
+
+    tracker only provides the azimuth and the nighttime fallback angle.
+    '''
+    def __init__(self, episodes, tracker, n_steps, module=None, inverter=None):
+        self.n_steps = n_steps
+        self.azimuth = tracker.get_azimuth()
+        self.module = get_module() if module is None else module
+        self.inverter = get_inverter() if inverter is None else inverter
+        self.cap = module_capacity(self.module)
+
+        features, columns, datetimes = [], {}, []
+        for episode in episodes:
+            steps = slice(episode.start, episode.start + n_steps)
+            tmy_data = episode.tmy_data.iloc[steps]
+            if len(tmy_data) < n_steps:
+                raise ValueError("episode starting at {} is shorter than {} steps".format(episode.start, n_steps))
+            frame = tmy_to_frame(tmy_data, tracker, episode.geometry.iloc[steps], episode.albedo)
+            features.append(features_from_frame(frame))
+            for col in ['Wspd', 'DryBulb', 'DHI', 'DNI', 'GHI', 'apparent_zenith', 'azimuth']:
+                columns.setdefault(col, []).append(np.asarray(frame[col], dtype=float))
+            datetimes.append(np.asarray(tmy_data.index.view('int64')))
+
+        #(K x n_steps x features) and (K x n_steps) per input
+        self.features = np.stack(features)
+        self.columns = {col: np.stack(values) for col, values in columns.items()}
+        self.datetimes = np.stack(datetimes)
+        self.albedos = np.array([float(episode.albedo) for episode in episodes])
+
+        self.t = 0
+        self.angles = np.zeros(len(episodes))
+
+    @classmethod
+    def from_stations(cls, locs, tracker, n_steps, albedos=(0.2,), starts=(0,), **kwargs):
+        '''
+        One episode per station x albedo x start step.
+        '''
+        episodes = []
+        for loc in locs:
+            tmy_data, _, _, geometry = load_station(loc)
+            episodes.extend(Episode(tmy_data, geometry, albedo, start) for albedo in albedos for start in starts)
+        return cls(episodes, tracker, n_steps, **kwargs)
+
+    def __len__(self):
+        return len(self.albedos)
+
+    def _observe(self):
+        obs = self.features[:, self.t].copy()
+        obs[:, PREV_ANGLE] = self.angles
+        return obs
+
+    def reset(self):
+        #trackers start flat, like run_sim_on_tracker
+        self.t = 0
+        self.angles = np.zeros(len(self))
+        return self._observe()
+
+    def ac(self, angles, t):
+        '''
+        ac power of every episode at step t, one calculate_energy_grid call per distinct albedo.
+        '''
+        ac = np.zeros(len(self))
+        for albedo in np.unique(self.albedos):
+            idx = self.albedos == albedo
+            step = {col: values[idx, t] for col, values in self.columns.items()}
+            ac[idx] = calculate_energy_grid(angles[idx].reshape(1, -1), self.azimuth, albedo, step['Wspd'], step['DryBulb'],
+                                            pd.DatetimeIndex(self.datetimes[idx, t]), step, step['DHI'], step['DNI'], step['GHI'],
+                                            module=self.module, inverter=self.inverter)[0]
+        return np.nan_to_num(ac)
+
+    def step(self, angles):
+        angles = np.asarray(angles, dtype=float)
+        ac = self.ac(angles, self.t)
+        move_energy = energy_motion(self.angles, angles, self.cap)
+        rewards = ac - move_energy*1000 #kwh to wh
+
+        self.angles = angles
+        self.t += 1
+        done = self.t >= self.n_steps
+        obs = self._observe() if not done else None
+        return obs, rewards, done, {'ac': ac, 'move_energy': move_energy}
+
+def run_vec_episodes(env, tracker, n_epochs=1):
+    '''
+    Runs tracker's batch act over all episodes of env for n_epochs, learning
+    carries over between epochs. The rewards of the last step are handed to
+    act(None, rewards) before the next epoch. Returns the (epochs x K) energy produced.
+    '''
+    totals = np.zeros((n_epochs, len(env)))
+    for e in range(n_epochs):
+        tracker.reset_batch()
+        obs = env.reset()
+        rewards = np.zeros(len(env))
+        done = False
+        while not done:
+            angles = tracker.act(obs, rewards)
+            obs, rewards, done, _ = env.step(angles)
+            totals[e] += rewards
+        tracker.act(None, rewards)
+    return totals